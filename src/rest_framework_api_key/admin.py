@@ -18,6 +18,7 @@ class APIKeyModelAdmin(admin.ModelAdmin):
         "expiry_date",
         "_has_expired",
         "revoked",
+        "last_used",
     )
     list_filter = ("created",)
     search_fields = ("name", "prefix")
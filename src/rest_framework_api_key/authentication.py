@@ -0,0 +1,64 @@
+import typing
+
+from django.http import HttpRequest
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.settings import api_settings
+
+from . import deferred
+from .crypto import VerificationUnavailable
+from .models import AbstractAPIKey, APIKey
+from .permissions import KeyParser, KeyVerificationUnavailable
+
+
+class BaseAPIKeyAuthentication(BaseAuthentication):
+    """
+    Set `request.auth` to the API key of the request.
+
+    API keys do not identify users, so `request.user` is set to the
+    unauthenticated user (`AnonymousUser` by default).
+    """
+
+    model: typing.Optional[typing.Type[AbstractAPIKey]] = None
+    key_parser = KeyParser()
+    # Related objects to load along with the API key, e.g. `("hero",)`.
+    select_related: typing.Sequence[str] = ()
+
+    def authenticate(
+        self, request: HttpRequest
+    ) -> typing.Optional[typing.Tuple[typing.Any, AbstractAPIKey]]:
+        assert self.model is not None, (
+            "%s must define `.model` with the API key model to use"
+            % self.__class__.__name__
+        )
+        key = self.key_parser.get(request)
+
+        if not key:
+            return None
+
+        try:
+            api_key = self.get_api_key(key)
+        except self.model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_("Invalid API key."))
+        except VerificationUnavailable:
+            raise KeyVerificationUnavailable()
+
+        deferred.record_usage(self.model, api_key.pk)
+        return self.get_user(api_key), api_key
+
+    def get_api_key(self, key: str) -> AbstractAPIKey:
+        assert self.model is not None
+        return self.model.objects.get_from_key(key, select_related=self.select_related)
+
+    def get_user(self, api_key: AbstractAPIKey) -> typing.Any:
+        if api_settings.UNAUTHENTICATED_USER:
+            return api_settings.UNAUTHENTICATED_USER()
+        return None
+
+    def authenticate_header(self, request: HttpRequest) -> str:
+        return self.key_parser.keyword
+
+
+class APIKeyAuthentication(BaseAPIKeyAuthentication):
+    model = APIKey
@@ -0,0 +1,56 @@
+"""
+Update large API key tables in batches, e.g. in data migrations.
+"""
+import typing
+
+from django.db import models, transaction
+
+
+def backfill(
+    queryset: models.QuerySet,
+    update: typing.Callable[[typing.Any], None],
+    fields: typing.Sequence[str],
+    batch_size: int = 1000,
+    start_after: typing.Any = None,
+    on_batch: typing.Optional[typing.Callable[[typing.Any, int], None]] = None,
+) -> int:
+    """
+    Call `update()` on each object of `queryset`, and save the given `fields`
+    using `bulk_update()`, one batch at a time.
+
+    Objects are processed in primary key order, starting after the
+    `start_after` primary key, if given. Each batch is read with a separate
+    query and saved in its own transaction, so memory usage is bounded and an
+    interrupted backfill can be resumed. After each batch, `on_batch()` is
+    called with the primary key of its last object and the size of the batch,
+    e.g. to record a checkpoint.
+
+    Return the number of updated objects.
+    """
+    model = queryset.model
+    manager = model._base_manager.db_manager(queryset.db)
+    queryset = queryset.order_by("pk")
+    updated = 0
+
+    while True:
+        if start_after is not None:
+            batch_queryset = queryset.filter(pk__gt=start_after)
+        else:
+            batch_queryset = queryset
+
+        objs = list(batch_queryset[:batch_size])
+
+        if not objs:
+            return updated
+
+        for obj in objs:
+            update(obj)
+
+        with transaction.atomic(using=queryset.db):
+            manager.bulk_update(objs, fields)
+
+        updated += len(objs)
+        start_after = objs[-1].pk
+
+        if on_batch is not None:
+            on_batch(start_after, len(objs))
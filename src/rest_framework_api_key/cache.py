@@ -0,0 +1,422 @@
+"""
+Opt-in caching of API key validation data.
+
+Cached entries map the prefix of an API key to the values of the matching row,
+so that validating a key does not require a database round trip. Entries can be
+stored in a process-local cache, in a Django cache shared by all processes, or
+both.
+"""
+import functools
+import hashlib
+import secrets
+import threading
+import time
+import typing
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.core.signals import setting_changed
+from django.db import models
+from django.dispatch import receiver
+
+from . import signals
+
+# An expiration timestamp, and the cached value.
+_Entry = typing.Tuple[float, typing.Any]
+
+
+class LocalKeyCache:
+    """
+    A process-local, thread-safe cache with a maximum size and a time-to-live.
+
+    When the cache is full, least recently used entries are evicted first.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "typing.OrderedDict[typing.Hashable, _Entry]" = typing.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: typing.Hashable) -> typing.Any:
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return None
+
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: typing.Hashable, value: typing.Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: typing.Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# Returned by `lookup()` when the API key is cached as not found.
+MISSING = object()
+
+# Stored in the shared cache in place of the values of API keys not found.
+_MISSING_VALUE = "missing"
+
+
+def _get_ttl() -> float:
+    return getattr(settings, "API_KEY_CACHE_TTL", 60)
+
+
+def _get_negative_ttl() -> float:
+    return getattr(settings, "API_KEY_CACHE_NEGATIVE_TTL", 0)
+
+
+@functools.lru_cache(maxsize=None)
+def get_local_cache() -> typing.Optional[LocalKeyCache]:
+    maxsize = getattr(settings, "API_KEY_CACHE_SIZE", 0)
+
+    if not maxsize:
+        return None
+
+    return LocalKeyCache(maxsize=maxsize, ttl=_get_ttl())
+
+
+@functools.lru_cache(maxsize=None)
+def get_local_negative_cache() -> typing.Optional[LocalKeyCache]:
+    maxsize = getattr(settings, "API_KEY_CACHE_SIZE", 0)
+    ttl = _get_negative_ttl()
+
+    if not maxsize or not ttl:
+        return None
+
+    # Kept apart from the main cache, so that floods of invalid keys
+    # cannot evict valid keys.
+    return LocalKeyCache(maxsize=maxsize, ttl=ttl)
+
+
+@receiver(setting_changed)
+def reset_caches(*, setting: str, **kwargs: typing.Any) -> None:
+    if setting in (
+        "API_KEY_CACHE_SIZE",
+        "API_KEY_CACHE_TTL",
+        "API_KEY_CACHE_NEGATIVE_TTL",
+    ):
+        get_local_cache.cache_clear()
+        get_local_negative_cache.cache_clear()
+
+
+def get_shared_cache() -> typing.Optional[BaseCache]:
+    alias = getattr(settings, "API_KEY_CACHE_ALIAS", None)
+
+    if alias is None:
+        return None
+
+    # NOTE: not memoized, as cache connections are thread-local.
+    return caches[alias]
+
+
+def make_key(manager: models.Manager, prefix: str) -> typing.Tuple[str, str, str]:
+    # Managers may restrict usable keys differently, so they are cached separately.
+    return (manager.model._meta.label, manager.name, prefix)
+
+
+def _make_shared_key(*parts: str) -> str:
+    # Prefixes come from client input, so hash them to always build valid keys.
+    digest = hashlib.sha256(":".join(parts).encode()).hexdigest()
+    return f"rest_framework_api_key:{digest}"
+
+
+def _make_version_key(model: typing.Type[models.Model], prefix: str) -> str:
+    return _make_shared_key("version", model._meta.label, prefix)
+
+
+def _make_version() -> str:
+    return secrets.token_hex(8)
+
+
+def _lookup_local(key: typing.Tuple[str, str, str]) -> typing.Any:
+    local_cache = get_local_cache()
+
+    if local_cache is not None:
+        values = local_cache.get(key)
+        if values is not None:
+            return values
+
+    local_negative_cache = get_local_negative_cache()
+
+    if local_negative_cache is not None:
+        if local_negative_cache.get(key) is not None:
+            return _MISSING_VALUE
+
+    return None
+
+
+def _store_local(key: typing.Tuple[str, str, str], values: typing.Any) -> None:
+    if values == _MISSING_VALUE:
+        local_cache = get_local_negative_cache()
+    else:
+        local_cache = get_local_cache()
+
+    if local_cache is not None:
+        local_cache.set(key, values)
+
+
+def _to_result(
+    manager: models.Manager, values: typing.Any, partial: bool
+) -> typing.Any:
+    if values is None:
+        return None
+
+    if values == _MISSING_VALUE:
+        return MISSING
+
+    field_names, field_values = values
+
+    # Partially loaded API keys would load missing fields one query at a time.
+    if not partial and len(field_names) < len(manager.model._meta.concrete_fields):
+        return None
+
+    return manager.model.from_db(manager.db, field_names, field_values)
+
+
+def _to_values(api_key: models.Model) -> tuple:
+    deferred_fields = api_key.get_deferred_fields()
+    field_names = tuple(
+        field.attname
+        for field in api_key._meta.concrete_fields
+        if field.attname not in deferred_fields
+    )
+    return field_names, tuple(getattr(api_key, name) for name in field_names)
+
+
+def _send_lookup_event(
+    manager: models.Manager, result: typing.Any, started: float
+) -> None:
+    if result is None:
+        outcome = "miss"
+    elif result is MISSING:
+        outcome = "negative_hit"
+    else:
+        outcome = "hit"
+
+    signals.send_event(manager.model, "cache", outcome, started)
+
+
+def lookup(
+    manager: models.Manager, prefix: str, partial: bool = False
+) -> typing.Tuple[typing.Any, typing.Optional[str]]:
+    """
+    Return the cached API key with the given `prefix`, `MISSING` if it is
+    cached as not found, or `None`.
+
+    If `partial` is true, the API key may have been cached with deferred fields.
+
+    Also return the version of the shared cache entry, which must be passed to
+    `store()` or `store_missing()` when populating the cache after a miss.
+    """
+    if not is_enabled():
+        return None, None
+
+    started = time.perf_counter()
+    key = make_key(manager, prefix)
+    values = _lookup_local(key)
+    version = None
+
+    if values is None:
+        shared_cache = get_shared_cache()
+
+        if shared_cache is not None:
+            # Entries are stored under a version which changes whenever the API
+            # key is invalidated. This prevents a concurrent request which read
+            # the row before invalidation from caching stale data.
+            version = shared_cache.get(_make_version_key(manager.model, prefix))
+
+            if version is not None:
+                values = shared_cache.get(_make_shared_key(*key, version))
+
+            if values is not None:
+                _store_local(key, values)
+
+    result = _to_result(manager, values, partial)
+    _send_lookup_event(manager, result, started)
+    return result, version
+
+
+async def alookup(
+    manager: models.Manager, prefix: str, partial: bool = False
+) -> typing.Tuple[typing.Any, typing.Optional[str]]:
+    if not is_enabled():
+        return None, None
+
+    started = time.perf_counter()
+    key = make_key(manager, prefix)
+    values = _lookup_local(key)
+    version = None
+
+    if values is None:
+        shared_cache = get_shared_cache()
+
+        if shared_cache is not None:
+            version = await shared_cache.aget(_make_version_key(manager.model, prefix))
+
+            if version is not None:
+                values = await shared_cache.aget(_make_shared_key(*key, version))
+
+            if values is not None:
+                _store_local(key, values)
+
+    result = _to_result(manager, values, partial)
+    _send_lookup_event(manager, result, started)
+    return result, version
+
+
+def _store_shared(
+    manager: models.Manager,
+    key: typing.Tuple[str, str, str],
+    values: typing.Any,
+    version: typing.Optional[str],
+    ttl: float,
+) -> None:
+    shared_cache = get_shared_cache()
+
+    if shared_cache is None:
+        return
+
+    if version is None:
+        # No version yet. If another process sets one in the meantime, the
+        # API key may have been invalidated, so do not store anything.
+        version = _make_version()
+        version_key = _make_version_key(manager.model, key[2])
+        if not shared_cache.add(version_key, version, timeout=_get_ttl()):
+            return
+
+    shared_cache.set(_make_shared_key(*key, version), values, timeout=ttl)
+
+
+async def _astore_shared(
+    manager: models.Manager,
+    key: typing.Tuple[str, str, str],
+    values: typing.Any,
+    version: typing.Optional[str],
+    ttl: float,
+) -> None:
+    shared_cache = get_shared_cache()
+
+    if shared_cache is None:
+        return
+
+    if version is None:
+        version = _make_version()
+        version_key = _make_version_key(manager.model, key[2])
+        if not await shared_cache.aadd(version_key, version, timeout=_get_ttl()):
+            return
+
+    await shared_cache.aset(_make_shared_key(*key, version), values, timeout=ttl)
+
+
+def is_enabled() -> bool:
+    return get_local_cache() is not None or get_shared_cache() is not None
+
+
+def store(
+    manager: models.Manager, api_key: models.Model, version: typing.Optional[str]
+) -> None:
+    if not is_enabled():
+        return
+
+    key = make_key(manager, getattr(api_key, "prefix"))
+    values = _to_values(api_key)
+    _store_local(key, values)
+    _store_shared(manager, key, values, version, ttl=_get_ttl())
+
+
+async def astore(
+    manager: models.Manager, api_key: models.Model, version: typing.Optional[str]
+) -> None:
+    if not is_enabled():
+        return
+
+    key = make_key(manager, getattr(api_key, "prefix"))
+    values = _to_values(api_key)
+    _store_local(key, values)
+    await _astore_shared(manager, key, values, version, ttl=_get_ttl())
+
+
+def store_missing(
+    manager: models.Manager, prefix: str, version: typing.Optional[str]
+) -> None:
+    ttl = _get_negative_ttl()
+
+    if not ttl:
+        return
+
+    key = make_key(manager, prefix)
+    _store_local(key, _MISSING_VALUE)
+    _store_shared(manager, key, _MISSING_VALUE, version, ttl=ttl)
+
+
+async def astore_missing(
+    manager: models.Manager, prefix: str, version: typing.Optional[str]
+) -> None:
+    ttl = _get_negative_ttl()
+
+    if not ttl:
+        return
+
+    key = make_key(manager, prefix)
+    _store_local(key, _MISSING_VALUE)
+    await _astore_shared(manager, key, _MISSING_VALUE, version, ttl=ttl)
+
+
+def _invalidate_local(model: typing.Type[models.Model], prefixes: list) -> None:
+    for local_cache in (get_local_cache(), get_local_negative_cache()):
+        if local_cache is not None:
+            for manager in model._meta.managers:
+                for prefix in prefixes:
+                    local_cache.delete(make_key(manager, prefix))
+
+
+def invalidate_many(
+    model: typing.Type[models.Model], prefixes: typing.Iterable[str]
+) -> None:
+    prefixes = list(prefixes)
+    _invalidate_local(model, prefixes)
+
+    shared_cache = get_shared_cache()
+
+    if shared_cache is not None:
+        # Orphan all entries stored under the previous versions.
+        versions = {
+            _make_version_key(model, prefix): _make_version() for prefix in prefixes
+        }
+        shared_cache.set_many(versions, timeout=_get_ttl())
+
+
+def invalidate(model: typing.Type[models.Model], prefix: str) -> None:
+    invalidate_many(model, [prefix])
+
+
+async def ainvalidate(model: typing.Type[models.Model], prefix: str) -> None:
+    _invalidate_local(model, [prefix])
+
+    shared_cache = get_shared_cache()
+
+    if shared_cache is not None:
+        version_key = _make_version_key(model, prefix)
+        await shared_cache.aset(version_key, _make_version(), timeout=_get_ttl())
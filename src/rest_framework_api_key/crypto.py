@@ -1,12 +1,23 @@
+import asyncio
+import functools
 import hashlib
+import hmac
+import threading
+import time
 import typing
+from concurrent.futures import ThreadPoolExecutor
 
+from django.conf import settings
+from django.contrib.auth.hashers import BasePasswordHasher, check_password
 from django.contrib.auth.hashers import (
-    BasePasswordHasher,
-    check_password,
-    make_password,
+    get_hashers_by_algorithm as get_password_hashers_by_algorithm,
 )
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils.crypto import constant_time_compare, get_random_string
+from django.utils.encoding import force_bytes
+from django.utils.module_loading import import_string
 
 
 def concatenate(left: str, right: str) -> str:
@@ -18,39 +29,219 @@ def split(concatenated: str) -> typing.Tuple[str, str]:
     return left, right
 
 
-class Sha512ApiKeyHasher(BasePasswordHasher):
+class BaseApiKeyHasher(BasePasswordHasher):
     """
-    An API key hasher using the sha512 algorithm.
+    Base class for API key hashers, which store a digest of the key.
 
-    This hasher should *NEVER* be used in Django's `PASSWORD_HASHERS` setting.
-    It is insecure for use in hashing passwords, but is safe for hashing
-    high entropy, randomly generated API keys.
+    API key hashers should *NEVER* be used in Django's `PASSWORD_HASHERS`
+    setting. They are insecure for use in hashing passwords, but are safe for
+    hashing high entropy, randomly generated API keys.
     """
 
-    algorithm = "sha512"
-
     def salt(self) -> str:
         """No need for a salt on a high entropy key."""
         return ""
 
+    def digest(self, password: str) -> str:
+        raise NotImplementedError
+
     def encode(self, password: str, salt: str) -> str:
         if salt != "":
             raise ValueError("salt is unnecessary for high entropy API tokens.")
-        hash = hashlib.sha512(password.encode()).hexdigest()
-        return "%s$$%s" % (self.algorithm, hash)
+        return "%s$$%s" % (self.algorithm, self.digest(password))
 
     def verify(self, password: str, encoded: str) -> bool:
         encoded_2 = self.encode(password, "")
         return constant_time_compare(encoded, encoded_2)
 
 
-class KeyGenerator:
-    preferred_hasher = Sha512ApiKeyHasher()
+class Sha512ApiKeyHasher(BaseApiKeyHasher):
+    """
+    An API key hasher using the sha512 algorithm.
+    """
+
+    algorithm = "sha512"
+
+    def digest(self, password: str) -> str:
+        return hashlib.sha512(password.encode()).hexdigest()
+
+
+class Blake2bApiKeyHasher(BaseApiKeyHasher):
+    """
+    An API key hasher using the BLAKE2b algorithm, with a 256-bit digest.
+
+    Faster than sha512 on 64-bit platforms, and stores shorter digests.
+    """
+
+    algorithm = "blake2b"
+
+    def digest(self, password: str) -> str:
+        return hashlib.blake2b(password.encode(), digest_size=32).hexdigest()
+
+
+class HmacSha256ApiKeyHasher(BaseApiKeyHasher):
+    """
+    An API key hasher using HMAC-SHA256, keyed with the `API_KEY_HMAC_PEPPER`
+    setting.
+
+    As the pepper is not stored in the database, hashed keys leaked from the
+    database alone cannot be checked against candidate keys.
+    """
+
+    algorithm = "hmac_sha256"
+
+    def digest(self, password: str) -> str:
+        pepper = getattr(settings, "API_KEY_HMAC_PEPPER", None)
+
+        if not pepper:
+            raise ImproperlyConfigured(
+                "The API_KEY_HMAC_PEPPER setting must not be empty "
+                "to use %s." % self.__class__.__name__
+            )
+
+        return hmac.digest(force_bytes(pepper), password.encode(), "sha256").hex()
+
+
+# Hashed keys using any of these hashers can be verified, and are upgraded
+# to the preferred hasher.
+API_KEY_HASHERS: typing.Tuple[typing.Type[BaseApiKeyHasher], ...] = (
+    Sha512ApiKeyHasher,
+    Blake2bApiKeyHasher,
+    HmacSha256ApiKeyHasher,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def get_preferred_hasher() -> BasePasswordHasher:
+    path = getattr(
+        settings, "API_KEY_HASHER", "rest_framework_api_key.crypto.Sha512ApiKeyHasher"
+    )
+    hasher_class = import_string(path)
+
+    # Keys hashed with other hashers (e.g. password hashers) would not be
+    # recognized as using the preferred hasher, and be hashed again on
+    # every validation.
+    if not isinstance(hasher_class, type) or not issubclass(
+        hasher_class, BaseApiKeyHasher
+    ):
+        raise ImproperlyConfigured(
+            "The API_KEY_HASHER setting must be the path to a subclass of "
+            "BaseApiKeyHasher, got %r." % path
+        )
+
+    return hasher_class()
+
+
+@functools.lru_cache(maxsize=None)
+def get_hashers_by_algorithm() -> typing.Dict[str, BasePasswordHasher]:
+    """
+    Return a table of the hashers which can verify hashed keys, by algorithm.
+
+    This includes API key hashers and Django's password hashers, so that
+    verifying keys bypasses `check_password()`.
+    """
+    hashers = dict(get_password_hashers_by_algorithm())
+    hashers.update((cls.algorithm, cls()) for cls in API_KEY_HASHERS)
+    preferred_hasher = get_preferred_hasher()
+    hashers[preferred_hasher.algorithm] = preferred_hasher
+    return hashers
+
 
+class VerificationUnavailable(Exception):
+    """
+    Raised when a key cannot be verified in time, because too many slow
+    verifications are already in progress.
+    """
+
+
+class BoundedExecutor:
+    """
+    Run functions with at most `max_workers` of them running at once, waiting
+    at most `timeout` seconds (or indefinitely if `None`) for a free worker.
+
+    Coroutines can run functions in a thread pool with `.arun()`, so that they
+    do not block the event loop.
+    """
+
+    def __init__(self, max_workers: int, timeout: typing.Optional[float] = None):
+        self.timeout = timeout
+        self._semaphore = threading.BoundedSemaphore(max_workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="rest_framework_api_key"
+        )
+
+    def run(
+        self,
+        func: typing.Callable[..., typing.Any],
+        *args: typing.Any,
+        deadline: typing.Optional[float] = None,
+    ) -> typing.Any:
+        if deadline is None and self.timeout is not None:
+            deadline = time.monotonic() + self.timeout
+
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+
+        if not self._semaphore.acquire(timeout=timeout):
+            raise VerificationUnavailable("Timed out waiting for a free worker.")
+
+        try:
+            return func(*args)
+        finally:
+            self._semaphore.release()
+
+    async def arun(
+        self, func: typing.Callable[..., typing.Any], *args: typing.Any
+    ) -> typing.Any:
+        # Time spent queued in the thread pool counts towards the timeout.
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.run, func, *args, deadline=deadline)
+        return await loop.run_in_executor(self._executor, call)
+
+
+@functools.lru_cache(maxsize=None)
+def get_password_executor() -> typing.Optional[BoundedExecutor]:
+    max_workers = getattr(settings, "API_KEY_PASSWORD_HASHER_CONCURRENCY", 0)
+
+    if not max_workers:
+        return None
+
+    timeout = getattr(settings, "API_KEY_PASSWORD_HASHER_TIMEOUT", None)
+    return BoundedExecutor(max_workers, timeout=timeout)
+
+
+def _verify_password(
+    key: str, hashed_key: str, hasher: typing.Optional[BasePasswordHasher]
+) -> bool:
+    if hasher is None:
+        # Hashed keys which do not start with their algorithm, e.g. unsalted
+        # MD5, are identified by Django.
+        return check_password(key, hashed_key)
+
+    return hasher.verify(key, hashed_key)
+
+
+@receiver(setting_changed)
+def reset_hashers(*, setting: str, **kwargs: typing.Any) -> None:
+    if setting in ("API_KEY_HASHER", "PASSWORD_HASHERS"):
+        get_preferred_hasher.cache_clear()
+        get_hashers_by_algorithm.cache_clear()
+    elif setting in (
+        "API_KEY_PASSWORD_HASHER_CONCURRENCY",
+        "API_KEY_PASSWORD_HASHER_TIMEOUT",
+    ):
+        get_password_executor.cache_clear()
+
+
+class KeyGenerator:
     def __init__(self, prefix_length: int = 8, secret_key_length: int = 32):
         self.prefix_length = prefix_length
         self.secret_key_length = secret_key_length
 
+    @property
+    def preferred_hasher(self) -> BasePasswordHasher:
+        return get_preferred_hasher()
+
     def get_prefix(self) -> str:
         return get_random_string(self.prefix_length)
 
@@ -58,7 +249,8 @@ class KeyGenerator:
         return get_random_string(self.secret_key_length)
 
     def hash(self, value: str) -> str:
-        return make_password(value, hasher=self.preferred_hasher)
+        hasher = self.preferred_hasher
+        return hasher.encode(value, hasher.salt())
 
     def generate(self) -> typing.Tuple[str, str, str]:
         prefix = self.get_prefix()
@@ -67,16 +259,57 @@ class KeyGenerator:
         hashed_key = self.hash(key)
         return key, prefix, hashed_key
 
+    def is_well_formed(self, key: str) -> bool:
+        """
+        Return whether `key` has the shape of keys made by this generator,
+        so that garbage can be rejected without looking it up.
+        """
+        prefix, found, secret_key = key.partition(".")
+        return (
+            bool(found)
+            and len(prefix) == self.prefix_length
+            and len(secret_key) == self.secret_key_length
+        )
+
+    def _get_hasher(self, hashed_key: str) -> typing.Optional[BasePasswordHasher]:
+        algorithm, _, _ = hashed_key.partition("$")
+        return get_hashers_by_algorithm().get(algorithm)
+
     def verify(self, key: str, hashed_key: str) -> bool:
         if self.using_preferred_hasher(hashed_key):
             # New simpler hasher
-            result = self.preferred_hasher.verify(key, hashed_key)
-        else:
-            # Slower password hashers from Django
-            # If verified, these will be transparently updated to the preferred hasher
-            result = check_password(key, hashed_key)
+            return self.preferred_hasher.verify(key, hashed_key)
+
+        # Other hashers, e.g. slower password hashers from Django
+        # If verified, these will be transparently updated to the preferred hasher
+        hasher = self._get_hasher(hashed_key)
+
+        if isinstance(hasher, BaseApiKeyHasher):
+            return hasher.verify(key, hashed_key)
+
+        executor = get_password_executor()
+
+        if executor is not None:
+            return executor.run(_verify_password, key, hashed_key, hasher)
+
+        return _verify_password(key, hashed_key, hasher)
+
+    async def averify(self, key: str, hashed_key: str) -> bool:
+        if self.using_preferred_hasher(hashed_key):
+            return self.preferred_hasher.verify(key, hashed_key)
+
+        hasher = self._get_hasher(hashed_key)
+
+        if isinstance(hasher, BaseApiKeyHasher):
+            return hasher.verify(key, hashed_key)
+
+        executor = get_password_executor()
+
+        if executor is not None:
+            # Do not block the event loop with slow password hashers.
+            return await executor.arun(_verify_password, key, hashed_key, hasher)
 
-        return result
+        return _verify_password(key, hashed_key, hasher)
 
     def using_preferred_hasher(self, hashed_key: str) -> bool:
         return hashed_key.startswith(f"{self.preferred_hasher.algorithm}$$")
@@ -0,0 +1,157 @@
+"""
+Writes to API key tables which can be deferred out of the request path.
+
+Pending writes are flushed when a request finishes, or by calling the flush
+functions directly (e.g. from a periodic batch job).
+"""
+import collections
+import logging
+import threading
+import time
+import typing
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, connections, models
+from django.dispatch import receiver
+from django.utils import timezone
+
+# (model, pk, prefix) -> (old hashed key, new hashed key)
+_HasherUpgrades = typing.Dict[
+    typing.Tuple[typing.Type[models.Model], typing.Any, str], typing.Tuple[str, str]
+]
+
+# (model, pk) -> when the API key was used
+_LastUsed = typing.Dict[typing.Tuple[typing.Type[models.Model], typing.Any], typing.Any]
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_hasher_upgrades: _HasherUpgrades = {}
+_last_used: _LastUsed = {}
+# (model, pk) -> `time.monotonic()` value of the last scheduled update
+_last_used_scheduled: typing.Dict[
+    typing.Tuple[typing.Type[models.Model], typing.Any], float
+] = {}
+
+
+def defer_hasher_upgrades() -> bool:
+    return getattr(settings, "API_KEY_DEFER_HASHER_UPGRADES", False)
+
+
+def schedule_hasher_upgrade(
+    model: typing.Type[models.Model],
+    pk: typing.Any,
+    prefix: str,
+    old_hashed_key: str,
+    new_hashed_key: str,
+) -> None:
+    with _lock:
+        _hasher_upgrades[(model, pk, prefix)] = (old_hashed_key, new_hashed_key)
+
+
+def flush_hasher_upgrades() -> int:
+    """
+    Apply pending hasher upgrades, and return the number of upgraded API keys.
+    """
+    global _hasher_upgrades
+
+    with _lock:
+        upgrades, _hasher_upgrades = _hasher_upgrades, {}
+
+    upgraded = 0
+
+    for (model, pk, prefix), (old_hashed_key, new_hashed_key) in upgrades.items():
+        manager = model.objects  # type: ignore
+        if manager.upgrade_hashed_key(pk, prefix, old_hashed_key, new_hashed_key):
+            upgraded += 1
+
+    return upgraded
+
+
+def get_last_used_interval() -> typing.Optional[float]:
+    return getattr(settings, "API_KEY_LAST_USED_INTERVAL", None)
+
+
+def record_usage(model: typing.Type[models.Model], pk: typing.Any) -> None:
+    """
+    Schedule an update of the `last_used` field of an API key, unless one was
+    scheduled less than `API_KEY_LAST_USED_INTERVAL` seconds ago.
+    """
+    interval = get_last_used_interval()
+
+    if interval is None:
+        return
+
+    now = time.monotonic()
+
+    with _lock:
+        scheduled = _last_used_scheduled.get((model, pk))
+        if scheduled is not None and now - scheduled < interval:
+            return
+        _last_used_scheduled[(model, pk)] = now
+        _last_used[(model, pk)] = timezone.now()
+
+
+def flush_last_used() -> int:
+    """
+    Apply pending `last_used` updates, with one `UPDATE` per API key model,
+    and return the number of updated API keys.
+    """
+    global _last_used, _last_used_scheduled
+
+    interval = get_last_used_interval() or 0
+    now = time.monotonic()
+
+    with _lock:
+        pending, _last_used = _last_used, {}
+        # Forget API keys which can be scheduled again.
+        _last_used_scheduled = {
+            key: scheduled
+            for key, scheduled in _last_used_scheduled.items()
+            if now - scheduled < interval
+        }
+
+    by_model: typing.DefaultDict[
+        typing.Type[models.Model], typing.List[typing.Any]
+    ] = collections.defaultdict(list)
+
+    for (model, pk), last_used in pending.items():
+        by_model[model].append((pk, last_used))
+
+    updated = 0
+
+    for model, usages in by_model.items():
+        # Update API keys of a model all at once, each with its own time.
+        last_used = models.Case(
+            *(models.When(pk=pk, then=models.Value(value)) for pk, value in usages),
+            output_field=models.DateTimeField(),
+        )
+        queryset = model._base_manager.filter(  # type: ignore
+            pk__in=[pk for pk, _ in usages]
+        )
+        updated += queryset.update(last_used=last_used)
+
+    return updated
+
+
+@receiver(request_finished)
+def flush(**kwargs: typing.Any) -> None:
+    if not _hasher_upgrades and not _last_used:
+        return
+
+    # Django closes database connections when requests finish, before this
+    # receiver runs: close the connections opened to flush writes likewise.
+    closed = [conn for conn in connections.all() if conn.connection is None]
+
+    try:
+        if _hasher_upgrades:
+            flush_hasher_upgrades()
+        if _last_used:
+            flush_last_used()
+    except DatabaseError:
+        # The response has been sent: don't fail while closing it.
+        logger.exception("Failed to flush deferred writes to API keys")
+    finally:
+        for conn in closed:
+            conn.close()
@@ -0,0 +1,65 @@
+import re
+import typing
+
+from django.db import models
+
+# Marks hashed keys stored as an algorithm followed by a raw digest.
+# Text never starts with a null byte, so other hashed keys are stored as is.
+_COMPACT = b"\x00"
+
+_HEX_DIGEST = re.compile(r"(?:[0-9a-f]{2})+")
+
+
+def encode_hashed_key(hashed_key: str) -> bytes:
+    algorithm, separator, digest = hashed_key.partition("$$")
+
+    if separator and algorithm and "$" not in algorithm:
+        if _HEX_DIGEST.fullmatch(digest):
+            return _COMPACT + algorithm.encode() + b"$" + bytes.fromhex(digest)
+
+    return hashed_key.encode()
+
+
+def decode_hashed_key(value: bytes) -> str:
+    if value.startswith(_COMPACT):
+        algorithm, _, digest = value[len(_COMPACT) :].partition(b"$")
+        return "%s$$%s" % (algorithm.decode(), digest.hex())
+
+    return value.decode()
+
+
+class HashedKeyField(models.BinaryField):
+    """
+    Stores hashed keys in binary form.
+
+    Hashed keys of API key hashers, such as `sha512$$<hex digest>`, are stored
+    with a raw digest, which halves their size. Other hashed keys (e.g. from
+    Django's password hashers) are stored as UTF-8 text.
+
+    Values are exposed as strings, like a `CharField`.
+    """
+
+    def get_default(self) -> typing.Any:
+        default = super().get_default()
+        return "" if default == b"" else default
+
+    def get_prep_value(self, value: typing.Any) -> typing.Any:
+        value = super().get_prep_value(value)
+        if isinstance(value, str):
+            value = encode_hashed_key(value)
+        return value
+
+    def from_db_value(
+        self, value: typing.Any, expression: typing.Any, connection: typing.Any
+    ) -> typing.Optional[str]:
+        if value is None:
+            return None
+        return decode_hashed_key(bytes(value))
+
+    def to_python(self, value: typing.Any) -> typing.Any:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return decode_hashed_key(bytes(value))
+        return value
+
+    def value_to_string(self, obj: models.Model) -> str:
+        return self.value_from_object(obj)
@@ -0,0 +1,79 @@
+import pathlib
+import typing
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import DEFAULT_DB_ALIAS, models
+
+from ...backfill import backfill
+
+
+class Command(BaseCommand):
+    help = (
+        "Populate the prefix and hashed key of API keys created before version 1.4 "
+        "from their ID, in batches, once a migration added these columns to a "
+        "custom API key model."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--model",
+            required=True,
+            help="Label of the API key model, e.g. organizations.OrganizationAPIKey.",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database to use (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of API keys updated per transaction (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=pathlib.Path,
+            help=(
+                "File storing the primary key of the last updated API key, "
+                "used to resume an interrupted run."
+            ),
+        )
+
+    def handle(self, *args: typing.Any, **options: typing.Any) -> None:
+        model = apps.get_model(options["model"])
+        checkpoint: typing.Optional[pathlib.Path] = options["checkpoint"]
+        start_after = None
+
+        if checkpoint is not None and checkpoint.exists():
+            start_after = model._meta.pk.to_python(checkpoint.read_text())
+
+        # Columns added by later versions may not exist yet: only load those
+        # which are needed.
+        queryset = (
+            model._base_manager.using(options["database"])
+            .filter(models.Q(prefix__isnull=True) | models.Q(prefix=""))
+            .only("pk", "prefix", "hashed_key")
+        )
+
+        def update(api_key: typing.Any) -> None:
+            prefix, _, hashed_key = api_key.pk.partition(".")
+            api_key.prefix = prefix
+            api_key.hashed_key = hashed_key
+
+        def on_batch(last_pk: typing.Any, size: int) -> None:
+            if checkpoint is not None:
+                checkpoint.write_text(str(last_pk))
+            self.stdout.write(f"Updated {size} API keys.")
+
+        updated = backfill(
+            queryset,
+            update,
+            fields=["prefix", "hashed_key"],
+            batch_size=options["batch_size"],
+            start_after=start_after,
+            on_batch=on_batch,
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Done: updated {updated} API keys."))
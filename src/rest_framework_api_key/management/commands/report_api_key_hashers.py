@@ -0,0 +1,110 @@
+import collections
+import typing
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import DEFAULT_DB_ALIAS
+
+from ...models import AbstractAPIKey
+
+
+class Command(BaseCommand):
+    help = (
+        "Report how many API keys use each hasher, to find API keys which have "
+        "not been upgraded to the preferred hasher yet."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="models",
+            help=(
+                "Label of an API key model to report on. "
+                "Can be repeated (default: all API key models)."
+            ),
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database to use (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of API keys read per query (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--include-unusable",
+            action="store_true",
+            help="Also count revoked and expired API keys.",
+        )
+
+    def handle(self, *args: typing.Any, **options: typing.Any) -> None:
+        if options["models"]:
+            models = [apps.get_model(label) for label in options["models"]]
+        else:
+            models = [
+                model
+                for model in apps.get_models()
+                if issubclass(model, AbstractAPIKey)
+            ]
+
+        for model in models:
+            self.report(model, **options)
+
+    def report(self, model: typing.Type[AbstractAPIKey], **options: typing.Any) -> None:
+        manager = model.objects.db_manager(options["database"])
+        key_generator = manager.key_generator
+
+        if options["include_unusable"]:
+            queryset = manager.all()
+        else:
+            queryset = manager.get_usable_keys()
+
+        counts: typing.Counter[str] = collections.Counter()
+        preferred = 0
+
+        for hashed_key in self._iter_hashed_keys(queryset, options["batch_size"]):
+            if key_generator.using_preferred_hasher(hashed_key):
+                preferred += 1
+            algorithm, found, _ = hashed_key.partition("$")
+            counts[algorithm if found else "unknown"] += 1
+
+        total = sum(counts.values())
+        outdated = total - preferred
+
+        style = self.style.WARNING if outdated else self.style.SUCCESS
+        self.stdout.write(
+            style(
+                f"{model._meta.label}: {outdated} of {total} API keys "
+                "use an outdated hasher."
+            )
+        )
+
+        # Most used hashers first.
+        for algorithm, count in sorted(
+            counts.items(), key=lambda item: (-item[1], item[0])
+        ):
+            self.stdout.write(f"  {algorithm}: {count}")
+
+    def _iter_hashed_keys(
+        self, queryset: typing.Any, batch_size: int
+    ) -> typing.Iterator[str]:
+        queryset = queryset.order_by("pk").values_list("pk", "hashed_key")
+        last_pk = None
+
+        while True:
+            if last_pk is not None:
+                batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            else:
+                batch = list(queryset[:batch_size])
+
+            if not batch:
+                return
+
+            for _, hashed_key in batch:
+                yield hashed_key
+
+            last_pk = batch[-1][0]
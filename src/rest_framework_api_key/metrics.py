@@ -0,0 +1,103 @@
+"""
+Adapters recording API key events as metrics.
+
+See `signals.api_key_event` for the events which are recorded.
+"""
+import collections
+import threading
+import typing
+
+from .signals import api_key_event
+
+_Labels = typing.Tuple[typing.Tuple[str, str], ...]
+
+
+class MetricsAdapter:
+    """
+    Record API key events as a counter and a histogram of durations, labelled
+    with the API key model, the event and its outcome.
+
+    Subclasses implement `increment()` and `observe()`, e.g. using a Prometheus
+    or StatsD client.
+    """
+
+    counter_name = "api_key_events_total"
+    histogram_name = "api_key_event_duration_seconds"
+
+    def connect(self) -> None:
+        api_key_event.connect(self.receive, weak=False)
+
+    def disconnect(self) -> None:
+        api_key_event.disconnect(self.receive)
+
+    def receive(
+        self,
+        sender: typing.Any,
+        *,
+        event: str,
+        outcome: str,
+        duration: float,
+        **kwargs: typing.Any,
+    ) -> None:
+        labels = {"model": sender._meta.label, "event": event, "outcome": outcome}
+        self.increment(self.counter_name, labels)
+        self.observe(self.histogram_name, duration, labels)
+
+    def increment(self, name: str, labels: typing.Dict[str, str]) -> None:
+        raise NotImplementedError
+
+    def observe(self, name: str, value: float, labels: typing.Dict[str, str]) -> None:
+        raise NotImplementedError
+
+
+class InMemoryMetrics(MetricsAdapter):
+    """
+    Record metrics in memory, e.g. to make assertions in tests.
+
+    Can be used as a context manager, which connects it while in use.
+    """
+
+    def __init__(self) -> None:
+        self.counters: typing.Counter[
+            typing.Tuple[str, _Labels]
+        ] = collections.Counter()
+        self.observations: typing.DefaultDict[
+            typing.Tuple[str, _Labels], typing.List[float]
+        ] = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "InMemoryMetrics":
+        self.connect()
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.disconnect()
+
+    def increment(self, name: str, labels: typing.Dict[str, str]) -> None:
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += 1
+
+    def observe(self, name: str, value: float, labels: typing.Dict[str, str]) -> None:
+        with self._lock:
+            self.observations[(name, tuple(sorted(labels.items())))].append(value)
+
+    def get_count(self, **labels: str) -> int:
+        """
+        Return the number of recorded events matching `labels`.
+        """
+        return sum(
+            count
+            for (name, key), count in self.counters.items()
+            if name == self.counter_name and labels.items() <= dict(key).items()
+        )
+
+    def get_durations(self, **labels: str) -> typing.List[float]:
+        """
+        Return the durations of recorded events matching `labels`.
+        """
+        return [
+            duration
+            for (name, key), durations in self.observations.items()
+            if name == self.histogram_name and labels.items() <= dict(key).items()
+            for duration in durations
+        ]
@@ -9,14 +9,20 @@ DEPENDENCIES = [(APP_NAME, "0003_auto_20190623_1952")]
 
 def populate_prefix_hashed_key(apps, schema_editor) -> None:  # type: ignore
     model = apps.get_model(APP_NAME, MODEL_NAME)
+    manager = model.objects.using(schema_editor.connection.alias)
+    queryset = manager.filter(prefix__isnull=True).order_by("pk")
 
-    for api_key in model.objects.using(
-        schema_editor.connection.alias
-    ).all():  # pragma: nodj22
-        prefix, _, hashed_key = api_key.id.partition(".")
-        api_key.prefix = prefix
-        api_key.hashed_key = hashed_key
-        api_key.save()
+    # Process API keys in batches, to bound memory usage on large tables.
+    batch = list(queryset[:1000])
+
+    while batch:  # pragma: nodj22
+        for api_key in batch:
+            prefix, _, hashed_key = api_key.id.partition(".")
+            api_key.prefix = prefix
+            api_key.hashed_key = hashed_key
+
+        manager.bulk_update(batch, ["prefix", "hashed_key"])
+        batch = list(queryset[:1000])
 
 
 class Migration(migrations.Migration):
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rest_framework_api_key", "0005_auto_20220110_1102"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="apikey",
+            index=models.Index(
+                fields=["prefix", "revoked", "expiry_date"],
+                name="rest_framew_prefix_5aac37_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rest_framework_api_key", "0006_apikey_rest_framew_prefix_5aac37_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="apikey",
+            name="last_used",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text=(
+                    "When the API key was last used. "
+                    "Only tracked if API_KEY_LAST_USED_INTERVAL is set."
+                ),
+                null=True,
+            ),
+        ),
+    ]
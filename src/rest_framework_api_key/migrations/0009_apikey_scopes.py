@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rest_framework_api_key", "0008_apikey_rate_limit_quota"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="apikey",
+            name="scopes",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text=(
+                    "Space-separated scopes granted to the API key, "
+                    'e.g. "heroes:read heroes:write".'
+                ),
+                max_length=255,
+            ),
+        ),
+    ]
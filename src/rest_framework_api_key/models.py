@@ -1,15 +1,78 @@
+import datetime as dt
+import functools
+import itertools
+import time
 import typing
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from . import cache, deferred, signals
 from .crypto import KeyGenerator, concatenate, split
+from .fields import HashedKeyField
+from .rates import validate_rate
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_scopes(scopes: str) -> typing.FrozenSet[str]:
+    # API keys usually share a few sets of scopes, so parse each set once.
+    return frozenset(scopes.split())
+
+
+class APIKeyQuerySet(models.QuerySet):
+    def revoke(self) -> int:
+        """
+        Revoke API keys in a single `UPDATE`, and return how many were revoked.
+        """
+        return self._update_keys(revoked=True)
+
+    def set_expiry(self, expiry_date: typing.Optional[dt.datetime]) -> int:
+        """
+        Set the expiry date of unrevoked API keys in a single `UPDATE`, and
+        return how many were updated.
+        """
+        return self._update_keys(expiry_date=expiry_date)
+
+    def _update_keys(self, **values: typing.Any) -> int:
+        # Revoked API keys cannot be changed.
+        queryset = self.filter(revoked=False)
+
+        if not cache.is_enabled():
+            return queryset.update(**values)
+
+        # Lock the rows while listing their prefixes, so that cache entries
+        # of all API keys affected by the update can be invalidated. Only
+        # lock API keys, not rows of tables joined by filters.
+        with transaction.atomic(using=self.db):
+            prefixes = list(
+                queryset.select_for_update(of=("self",)).values_list(
+                    "prefix", flat=True
+                )
+            )
+            count = queryset.update(**values)
+
+        cache.invalidate_many(self.model, prefixes)
+        return count
 
 
 class BaseAPIKeyManager(models.Manager):
     key_generator = KeyGenerator()
+    validation_fields: typing.Tuple[str, ...] = (
+        "prefix",
+        "hashed_key",
+        "revoked",
+        "expiry_date",
+        "rate_limit",
+        "quota",
+        "scopes",
+    )
+    # Relations loaded along with API keys when validating them, e.g. `("hero",)`.
+    validation_select_related: typing.Tuple[str, ...] = ()
+
+    def get_queryset(self) -> APIKeyQuerySet:
+        return APIKeyQuerySet(self.model, using=self._db)
 
     def assign_key(self, obj: "AbstractAPIKey") -> str:
         try:
@@ -24,7 +87,10 @@ class BaseAPIKeyManager(models.Manager):
         else:
             pk = concatenate(prefix, hashed_key)
 
-        obj.id = pk
+        # Compact API key models use an auto-incremented primary key instead.
+        if not isinstance(obj._meta.pk, models.AutoField):
+            obj.id = pk
+
         obj.prefix = prefix
         obj.hashed_key = hashed_key
 
@@ -38,33 +104,361 @@ class BaseAPIKeyManager(models.Manager):
         obj.save()
         return obj, key
 
+    async def acreate_key(
+        self, **kwargs: typing.Any
+    ) -> typing.Tuple["AbstractAPIKey", str]:
+        kwargs.pop("id", None)
+        obj = self.model(**kwargs)
+        key = self.assign_key(obj)
+        await obj.asave()
+        return obj, key
+
+    def bulk_create_keys(
+        self,
+        keys: typing.Union[int, typing.Iterable[typing.Dict[str, typing.Any]]],
+        batch_size: int = 500,
+        **kwargs: typing.Any,
+    ) -> typing.Iterator[typing.Tuple["AbstractAPIKey", str]]:
+        """
+        Create API keys in batches, and yield them along with their generated key.
+
+        `keys` is either the number of API keys to create, or an iterable of
+        keyword arguments to create each API key with. Extra `kwargs` are used
+        to create all API keys.
+
+        API keys are created lazily, as the result is iterated over.
+        """
+        if isinstance(keys, int):
+            keys = ({} for _ in range(keys))
+
+        keys = ({**kwargs, **key_kwargs} for key_kwargs in keys)
+
+        while True:
+            batch = list(itertools.islice(keys, batch_size))
+            if not batch:
+                return
+            yield from self._bulk_create_batch(batch)
+
+    def _bulk_create_batch(
+        self, batch: typing.List[typing.Dict[str, typing.Any]]
+    ) -> typing.List[typing.Tuple["AbstractAPIKey", str]]:
+        objs = []
+        keys = []
+
+        for kwargs in batch:
+            # Prevent from manually setting the primary key.
+            kwargs = {name: value for name, value in kwargs.items() if name != "id"}
+            obj = self.model(**kwargs)
+            keys.append(self.assign_key(obj))
+            objs.append(obj)
+
+        # Prefixes are unique, so regenerate keys whose prefix is already taken
+        # instead of failing the whole batch upon insertion.
+        colliding = objs
+
+        while colliding:
+            taken = set(
+                self.model._base_manager.filter(
+                    prefix__in=[obj.prefix for obj in colliding]
+                ).values_list("prefix", flat=True)
+            )
+            seen: typing.Set[str] = set()
+            colliding = []
+
+            for index, obj in enumerate(objs):
+                if obj.prefix in taken or obj.prefix in seen:
+                    keys[index] = self.assign_key(obj)
+                    colliding.append(obj)
+                seen.add(obj.prefix)
+
+        self.bulk_create(objs)
+
+        # The prefixes may have been cached as not found.
+        cache.invalidate_many(self.model, [obj.prefix for obj in objs])
+
+        return list(zip(objs, keys))
+
     def get_usable_keys(self) -> models.QuerySet:
-        return self.filter(revoked=False)
+        not_expired = models.Q(expiry_date__isnull=True) | models.Q(
+            expiry_date__gt=timezone.now()
+        )
+        return self.filter(not_expired, revoked=False)
+
+    def _select_validation_related(self, queryset: models.QuerySet) -> models.QuerySet:
+        # Calling `.select_related()` without fields would follow all relations.
+        if not self.validation_select_related:
+            return queryset
+        return queryset.select_related(*self.validation_select_related)
+
+    def _get_lookup_queryset(
+        self, select_related: typing.Sequence[str]
+    ) -> models.QuerySet:
+        queryset = self._select_validation_related(self.get_usable_keys())
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        return queryset
+
+    def get_from_key(
+        self, key: str, select_related: typing.Sequence[str] = ()
+    ) -> "AbstractAPIKey":
+        """
+        Return the usable API key matching `key`, or raise `DoesNotExist`.
+
+        Relations listed in `select_related` are loaded in the same query,
+        bypassing the cache, which does not store related objects.
+        """
+        if not self._is_well_formed(key):
+            raise self._does_not_exist()
 
-    def get_from_key(self, key: str) -> "AbstractAPIKey":
         prefix, _, _ = key.partition(".")
-        queryset = self.get_usable_keys()
+        api_key, version = cache.lookup(self, prefix)
 
-        try:
-            api_key = queryset.get(prefix=prefix)
-        except self.model.DoesNotExist:
-            raise  # For the sake of being explicit.
+        if api_key is cache.MISSING:
+            raise self._does_not_exist()
+
+        # Cached API keys do not include related objects.
+        if select_related:
+            api_key = None
+
+        if api_key is None:
+            queryset = self._get_lookup_queryset(select_related)
+            started = time.perf_counter()
+
+            try:
+                api_key = queryset.get(prefix=prefix)
+            except self.model.DoesNotExist:
+                signals.send_event(self.model, "lookup", "not_found", started)
+                cache.store_missing(self, prefix, version)
+                raise
+
+            signals.send_event(self.model, "lookup", "found", started)
+            cache.store(self, api_key, version)
+        elif api_key.has_expired:  # Expired while cached.
+            raise self._does_not_exist()
 
         if not api_key.is_valid(key):
             raise self.model.DoesNotExist("Key is not valid.")
         else:
             return api_key
 
-    def is_valid(self, key: str) -> bool:
-        try:
-            api_key = self.get_from_key(key)
-        except self.model.DoesNotExist:
-            return False
+    async def aget_from_key(
+        self, key: str, select_related: typing.Sequence[str] = ()
+    ) -> "AbstractAPIKey":
+        if not self._is_well_formed(key):
+            raise self._does_not_exist()
 
-        if api_key.has_expired:
-            return False
+        prefix, _, _ = key.partition(".")
+        api_key, version = await cache.alookup(self, prefix)
+
+        if api_key is cache.MISSING:
+            raise self._does_not_exist()
+
+        # Cached API keys do not include related objects.
+        if select_related:
+            api_key = None
+
+        if api_key is None:
+            queryset = self._get_lookup_queryset(select_related)
+            started = time.perf_counter()
+
+            try:
+                api_key = await queryset.aget(prefix=prefix)
+            except self.model.DoesNotExist:
+                signals.send_event(self.model, "lookup", "not_found", started)
+                await cache.astore_missing(self, prefix, version)
+                raise
+
+            signals.send_event(self.model, "lookup", "found", started)
+            await cache.astore(self, api_key, version)
+        elif api_key.has_expired:  # Expired while cached.
+            raise self._does_not_exist()
+
+        if not await api_key.ais_valid(key):
+            raise self.model.DoesNotExist("Key is not valid.")
+        else:
+            return api_key
+
+    def _is_well_formed(self, key: str) -> bool:
+        # Custom key generators may not implement `.is_well_formed()`.
+        is_well_formed = getattr(self.key_generator, "is_well_formed", None)
+        return is_well_formed is None or is_well_formed(key)
+
+    def _does_not_exist(self) -> Exception:
+        return self.model.DoesNotExist(
+            "%s matching query does not exist." % self.model._meta.object_name
+        )
+
+    def get_validation_queryset(self) -> models.QuerySet:
+        # Only load what is needed to validate API keys, along with related
+        # objects (whose foreign keys must not be deferred).
+        queryset = self.get_usable_keys().only(
+            *self.validation_fields, *self.validation_select_related
+        )
+        return self._select_validation_related(queryset)
+
+    def get_valid_key(self, key: str) -> typing.Optional["AbstractAPIKey"]:
+        """
+        Return the API key matching `key` if it is valid, or `None`.
+
+        Fields other than `validation_fields` may be deferred.
+        """
+        if not self._is_well_formed(key):
+            return None
+
+        prefix, _, _ = key.partition(".")
+        api_key, version = cache.lookup(self, prefix, partial=True)
+
+        if api_key is cache.MISSING:
+            return None
+
+        if api_key is None:
+            queryset = self.get_validation_queryset()
+            started = time.perf_counter()
+
+            try:
+                api_key = queryset.get(prefix=prefix)
+            except self.model.DoesNotExist:
+                signals.send_event(self.model, "lookup", "not_found", started)
+                cache.store_missing(self, prefix, version)
+                return None
+
+            signals.send_event(self.model, "lookup", "found", started)
+            cache.store(self, api_key, version)
 
-        return True
+        if api_key.has_expired or not api_key.is_valid(key):
+            return None
+
+        return api_key
+
+    async def aget_valid_key(self, key: str) -> typing.Optional["AbstractAPIKey"]:
+        if not self._is_well_formed(key):
+            return None
+
+        prefix, _, _ = key.partition(".")
+        api_key, version = await cache.alookup(self, prefix, partial=True)
+
+        if api_key is cache.MISSING:
+            return None
+
+        if api_key is None:
+            queryset = self.get_validation_queryset()
+            started = time.perf_counter()
+
+            try:
+                api_key = await queryset.aget(prefix=prefix)
+            except self.model.DoesNotExist:
+                signals.send_event(self.model, "lookup", "not_found", started)
+                await cache.astore_missing(self, prefix, version)
+                return None
+
+            signals.send_event(self.model, "lookup", "found", started)
+            await cache.astore(self, api_key, version)
+
+        if api_key.has_expired or not await api_key.ais_valid(key):
+            return None
+
+        return api_key
+
+    def validate_many(
+        self, keys: typing.Iterable[str], batch_size: int = 1000
+    ) -> typing.Dict[str, typing.Optional["AbstractAPIKey"]]:
+        """
+        Return a dict mapping each of `keys` to its API key if it is valid,
+        or to `None`.
+
+        API keys are fetched with one query per `batch_size` keys, bypassing
+        the cache. Fields other than `validation_fields` may be deferred.
+        """
+        result: typing.Dict[str, typing.Optional["AbstractAPIKey"]] = dict.fromkeys(
+            keys
+        )
+        # Malformed keys are not looked up.
+        keys = [key for key in result if self._is_well_formed(key)]
+
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start : start + batch_size]
+            prefixes = {key.partition(".")[0] for key in batch}
+            queryset = self.get_validation_queryset().filter(prefix__in=prefixes)
+            started = time.perf_counter()
+            api_keys = {api_key.prefix: api_key for api_key in queryset}
+            self._send_lookup_events(prefixes, api_keys, started)
+
+            for key in batch:
+                api_key = api_keys.get(key.partition(".")[0])
+                if api_key is not None and api_key.is_valid(key):
+                    result[key] = api_key
+                else:
+                    result[key] = None
+
+        return result
+
+    async def avalidate_many(
+        self, keys: typing.Iterable[str], batch_size: int = 1000
+    ) -> typing.Dict[str, typing.Optional["AbstractAPIKey"]]:
+        result: typing.Dict[str, typing.Optional["AbstractAPIKey"]] = dict.fromkeys(
+            keys
+        )
+        # Malformed keys are not looked up.
+        keys = [key for key in result if self._is_well_formed(key)]
+
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start : start + batch_size]
+            prefixes = {key.partition(".")[0] for key in batch}
+            queryset = self.get_validation_queryset().filter(prefix__in=prefixes)
+            started = time.perf_counter()
+            api_keys = {api_key.prefix: api_key async for api_key in queryset}
+            self._send_lookup_events(prefixes, api_keys, started)
+
+            for key in batch:
+                api_key = api_keys.get(key.partition(".")[0])
+                if api_key is not None and await api_key.ais_valid(key):
+                    result[key] = api_key
+                else:
+                    result[key] = None
+
+        return result
+
+    def _send_lookup_events(
+        self,
+        prefixes: typing.Set[str],
+        api_keys: typing.Dict[str, typing.Any],
+        started: float,
+    ) -> None:
+        for prefix in prefixes:
+            outcome = "found" if prefix in api_keys else "not_found"
+            signals.send_event(self.model, "lookup", outcome, started)
+
+    def upgrade_hashed_key(
+        self, pk: typing.Any, prefix: str, old_hashed_key: str, new_hashed_key: str
+    ) -> bool:
+        """
+        Replace the hashed key of an API key, unless it has changed concurrently.
+
+        Return whether the API key was updated.
+        """
+        # Note that since the PK includes the hashed key,
+        # they will be internally inconsistent following this upgrade.
+        # See: https://github.com/florimondmanca/djangorestframework-api-key/issues/128
+        queryset = self.model._base_manager.filter(pk=pk, hashed_key=old_hashed_key)
+        updated = queryset.update(hashed_key=new_hashed_key)
+        if updated:
+            cache.invalidate(self.model, prefix)
+        return bool(updated)
+
+    async def aupgrade_hashed_key(
+        self, pk: typing.Any, prefix: str, old_hashed_key: str, new_hashed_key: str
+    ) -> bool:
+        queryset = self.model._base_manager.filter(pk=pk, hashed_key=old_hashed_key)
+        updated = await queryset.aupdate(hashed_key=new_hashed_key)
+        if updated:
+            await cache.ainvalidate(self.model, prefix)
+        return bool(updated)
+
+    def is_valid(self, key: str) -> bool:
+        return self.get_valid_key(key) is not None
+
+    async def ais_valid(self, key: str) -> bool:
+        return await self.aget_valid_key(key) is not None
 
 
 class APIKeyManager(BaseAPIKeyManager):
@@ -106,10 +500,53 @@ class AbstractAPIKey(models.Model):
         verbose_name=_("Expires"),
         help_text=_("Once API key expires, clients cannot use it anymore."),
     )
+    rate_limit = models.CharField(
+        max_length=20,
+        blank=True,
+        default="",
+        validators=[validate_rate],
+        help_text=_(
+            'Maximum request rate, e.g. "10/s" or "100/min". '
+            "Leave empty for no limit."
+        ),
+    )
+    quota = models.CharField(
+        max_length=20,
+        blank=True,
+        default="",
+        validators=[validate_rate],
+        help_text=_(
+            "Maximum number of requests over a longer period, "
+            'e.g. "10000/day". '
+            "Leave empty for no quota."
+        ),
+    )
+    scopes = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        help_text=_(
+            "Space-separated scopes granted to the API key, "
+            'e.g. "heroes:read heroes:write".'
+        ),
+    )
+    last_used = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text=_(
+            "When the API key was last used. "
+            "Only tracked if API_KEY_LAST_USED_INTERVAL is set."
+        ),
+    )
 
     class Meta:  # noqa
         abstract = True
         ordering = ("-created",)
+        indexes = [
+            # Covers lookups of usable keys.
+            models.Index(fields=["prefix", "revoked", "expiry_date"]),
+        ]
         verbose_name = "API key"
         verbose_name_plural = "API keys"
 
@@ -127,18 +564,71 @@ class AbstractAPIKey(models.Model):
     _has_expired.boolean = True  # type: ignore
     has_expired = property(_has_expired)
 
+    def get_scopes(self) -> typing.FrozenSet[str]:
+        return parse_scopes(self.scopes)
+
+    def has_scopes(self, scopes: typing.AbstractSet[str]) -> bool:
+        return scopes <= self.get_scopes()
+
     def is_valid(self, key: str) -> bool:
         key_generator = type(self).objects.key_generator
+        started = time.perf_counter()
         valid = key_generator.verify(key, self.hashed_key)
+        outcome = "valid" if valid else "invalid"
+        signals.send_event(type(self), "verify", outcome, started)
 
         # Transparently update the key to use the preferred hasher
         # if it is using an outdated hasher.
         if valid and not key_generator.using_preferred_hasher(self.hashed_key):
-            # Note that since the PK includes the hashed key,
-            # they will be internally inconsistent following this upgrade.
-            # See: https://github.com/florimondmanca/djangorestframework-api-key/issues/128
+            started = time.perf_counter()
+            old_hashed_key = self.hashed_key
             self.hashed_key = key_generator.hash(key)
-            self.save()
+
+            if deferred.defer_hasher_upgrades():
+                deferred.schedule_hasher_upgrade(
+                    type(self), self.pk, self.prefix, old_hashed_key, self.hashed_key
+                )
+                outcome = "deferred"
+            else:
+                upgraded = type(self).objects.upgrade_hashed_key(
+                    self.pk, self.prefix, old_hashed_key, self.hashed_key
+                )
+                outcome = "upgraded" if upgraded else "conflict"
+
+            signals.send_event(type(self), "upgrade", outcome, started)
+
+        return valid
+
+    async def ais_valid(self, key: str) -> bool:
+        key_generator = type(self).objects.key_generator
+        started = time.perf_counter()
+
+        # Custom key generators may only implement `.verify()`.
+        if hasattr(key_generator, "averify"):
+            valid = await key_generator.averify(key, self.hashed_key)
+        else:
+            valid = key_generator.verify(key, self.hashed_key)
+
+        outcome = "valid" if valid else "invalid"
+        signals.send_event(type(self), "verify", outcome, started)
+
+        if valid and not key_generator.using_preferred_hasher(self.hashed_key):
+            started = time.perf_counter()
+            old_hashed_key = self.hashed_key
+            self.hashed_key = key_generator.hash(key)
+
+            if deferred.defer_hasher_upgrades():
+                deferred.schedule_hasher_upgrade(
+                    type(self), self.pk, self.prefix, old_hashed_key, self.hashed_key
+                )
+                outcome = "deferred"
+            else:
+                upgraded = await type(self).objects.aupgrade_hashed_key(
+                    self.pk, self.prefix, old_hashed_key, self.hashed_key
+                )
+                outcome = "upgraded" if upgraded else "conflict"
+
+            signals.send_event(type(self), "upgrade", outcome, started)
 
         return valid
 
@@ -148,6 +638,14 @@ class AbstractAPIKey(models.Model):
     def save(self, *args: typing.Any, **kwargs: typing.Any) -> None:
         self._validate_revoked()
         super().save(*args, **kwargs)
+        # Make sure creation, revocation and expiry changes are seen
+        # by cached validation.
+        cache.invalidate(type(self), self.prefix)
+
+    def delete(self, *args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        result = super().delete(*args, **kwargs)
+        cache.invalidate(type(self), self.prefix)
+        return result
 
     def _validate_revoked(self) -> None:
         if self._initial_revoked and not self.revoked:
@@ -159,5 +657,18 @@ class AbstractAPIKey(models.Model):
         return str(self.name)
 
 
+class AbstractCompactAPIKey(AbstractAPIKey):
+    """
+    An API key model which stores hashed keys in binary form, and uses an
+    auto-incremented primary key instead of one containing the hashed key.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    hashed_key = HashedKeyField(max_length=150)
+
+    class Meta(AbstractAPIKey.Meta):
+        abstract = True
+
+
 class APIKey(AbstractAPIKey):
     pass
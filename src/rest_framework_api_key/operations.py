@@ -0,0 +1,82 @@
+"""
+Migration operations for API key models.
+"""
+import itertools
+import typing
+
+from django.db import migrations
+
+
+class CopyAPIKeys(migrations.RunPython):
+    """
+    Copy API keys from one model to another, e.g. to move existing API keys to
+    a model based on `AbstractCompactAPIKey`.
+
+    Fields which exist on both models are copied, except for primary keys.
+    API keys are read and inserted in batches of `batch_size`.
+    """
+
+    def __init__(self, from_model: str, to_model: str, batch_size: int = 1000):
+        self.from_model = from_model
+        self.to_model = to_model
+        self.batch_size = batch_size
+        super().__init__(self.copy, migrations.RunPython.noop)
+
+    def deconstruct(self) -> typing.Tuple[str, list, dict]:
+        return (
+            self.__class__.__qualname__,
+            [self.from_model, self.to_model],
+            {"batch_size": self.batch_size},
+        )
+
+    def copy(self, apps: typing.Any, schema_editor: typing.Any) -> None:
+        alias = schema_editor.connection.alias
+        from_model = apps.get_model(self.from_model)
+        to_model = apps.get_model(self.to_model)
+
+        from_fields = {field.attname for field in from_model._meta.concrete_fields}
+        fields = [
+            field.attname
+            for field in to_model._meta.concrete_fields
+            if field.attname in from_fields and not field.primary_key
+        ]
+
+        # Historical models are private to migrations, so creation dates can
+        # be preserved by disabling `auto_now_add` on them while copying.
+        auto_now_add_fields = [
+            field
+            for field in to_model._meta.concrete_fields
+            if field.attname in fields and getattr(field, "auto_now_add", False)
+        ]
+
+        for field in auto_now_add_fields:
+            field.auto_now_add = False
+
+        try:
+            self._copy_rows(from_model, to_model, fields, alias)
+        finally:
+            for field in auto_now_add_fields:
+                field.auto_now_add = True
+
+    def _copy_rows(
+        self,
+        from_model: typing.Any,
+        to_model: typing.Any,
+        fields: typing.List[str],
+        alias: str,
+    ) -> None:
+        rows = (
+            from_model._base_manager.using(alias)
+            .order_by("pk")
+            .values_list(*fields)
+            .iterator(chunk_size=self.batch_size)
+        )
+
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+
+            if not batch:
+                return
+
+            objs = [to_model(**dict(zip(fields, row))) for row in batch]
+            to_model._base_manager.using(alias).bulk_create(objs)
@@ -1,27 +1,94 @@
+import asyncio
+import functools
+import inspect
+import time
 import typing
 
 import packaging.version
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.http import HttpRequest
+from django.utils.translation import gettext_lazy as _
 from rest_framework import __version__ as __drf_version__
-from rest_framework import permissions
+from rest_framework import exceptions, permissions
 
-from .models import AbstractAPIKey, APIKey
+from . import deferred, signals
+from .crypto import VerificationUnavailable
+from .models import AbstractAPIKey, APIKey, parse_scopes
 
 _drf_version = packaging.version.parse(__drf_version__)
 _3_14_0 = packaging.version.parse("3.14.0")
 
 
+class KeyVerificationUnavailable(exceptions.APIException):
+    status_code = 503
+    default_detail = _("API key verification is unavailable, try again later.")
+    default_code = "api_key_verification_unavailable"
+
+
+# Methods of `KeyParser` reading API keys from each kind of source.
+_SOURCE_METHODS = {
+    "authorization": "get_from_authorization",
+    "header": "get_from_header",
+    "query": "get_from_query_param",
+    "cookie": "get_from_cookie",
+}
+
+_KeySources = typing.Tuple[typing.Tuple[str, typing.Tuple[str, ...]], ...]
+
+
+@functools.lru_cache(maxsize=None)
+def get_key_sources() -> _KeySources:
+    """
+    Return the `KeyParser` methods to call, and their extra arguments, in order.
+    """
+    sources = getattr(settings, "API_KEY_SOURCES", None)
+
+    if sources is None:
+        custom_header = getattr(settings, "API_KEY_CUSTOM_HEADER", None)
+        if custom_header is not None:
+            sources = [f"header:{custom_header}"]
+        else:
+            sources = ["authorization"]
+
+    result = []
+
+    for source in sources:
+        kind, _, name = source.partition(":")
+
+        if kind not in _SOURCE_METHODS or bool(name) == (kind == "authorization"):
+            raise ImproperlyConfigured(
+                f"Invalid API key source: {source!r}. Expected 'authorization', "
+                "'header:<META key>', 'query:<parameter>' or 'cookie:<name>'."
+            )
+
+        result.append((_SOURCE_METHODS[kind], (name,) if name else ()))
+
+    return tuple(result)
+
+
+@receiver(setting_changed)
+def reset_key_sources(*, setting: str, **kwargs: typing.Any) -> None:
+    if setting in ("API_KEY_SOURCES", "API_KEY_CUSTOM_HEADER"):
+        get_key_sources.cache_clear()
+
+
 class KeyParser:
     keyword = "Api-Key"
 
     def get(self, request: HttpRequest) -> typing.Optional[str]:
-        custom_header = getattr(settings, "API_KEY_CUSTOM_HEADER", None)
+        for method, args in get_key_sources():
+            key = getattr(self, method)(request, *args)
+            if key:
+                return key
 
-        if custom_header is not None:
-            return self.get_from_header(request, custom_header)
+        return None
 
-        return self.get_from_authorization(request)
+    @functools.cached_property
+    def _lowercase_keyword(self) -> str:
+        return self.keyword.lower()
 
     def get_from_authorization(self, request: HttpRequest) -> typing.Optional[str]:
         authorization = request.META.get("HTTP_AUTHORIZATION", "")
@@ -34,7 +101,7 @@ class KeyParser:
         if not found:
             return None
 
-        if keyword.lower() != self.keyword.lower():
+        if keyword.lower() != self._lowercase_keyword:
             return None
 
         return key
@@ -42,6 +109,45 @@ class KeyParser:
     def get_from_header(self, request: HttpRequest, name: str) -> typing.Optional[str]:
         return request.META.get(name) or None
 
+    def get_from_query_param(
+        self, request: HttpRequest, name: str
+    ) -> typing.Optional[str]:
+        return request.GET.get(name) or None
+
+    def get_from_cookie(self, request: HttpRequest, name: str) -> typing.Optional[str]:
+        return request.COOKIES.get(name) or None
+
+
+_RequestMemo = typing.Dict[typing.Tuple[type, str], typing.Optional[AbstractAPIKey]]
+
+
+def _get_request_memo(request: HttpRequest) -> _RequestMemo:
+    # Store the memo on the underlying `HttpRequest`, so that it is shared
+    # by all DRF `Request` objects wrapping it.
+    request = getattr(request, "_request", request)
+
+    try:
+        return request._api_key_memo  # type: ignore
+    except AttributeError:
+        memo: _RequestMemo = {}
+        request._api_key_memo = memo  # type: ignore
+        return memo
+
+
+def _get_authenticated_key(
+    request: HttpRequest, model: typing.Type[AbstractAPIKey], key: str
+) -> typing.Optional[AbstractAPIKey]:
+    auth = getattr(request, "auth", None)
+
+    if not isinstance(auth, model) or auth.prefix != key.partition(".")[0]:
+        return None
+
+    # Don't trust API keys which can't be used anymore.
+    if auth.revoked or auth.has_expired:
+        return None
+
+    return auth
+
 
 class BaseHasAPIKey(permissions.BasePermission):
     model: typing.Optional[typing.Type[AbstractAPIKey]] = None
@@ -55,10 +161,58 @@ class BaseHasAPIKey(permissions.BasePermission):
             "%s must define `.model` with the API key model to use"
             % self.__class__.__name__
         )
+        started = time.perf_counter()
         key = self.get_key(request)
+        outcome = "found" if key else "not_found"
+        signals.send_event(self.model, "parse", outcome, started)
         if not key:
             return False
-        return self.model.objects.is_valid(key)
+        api_key = self.get_api_key(request, key)
+        return api_key is not None and self.has_api_key_permission(
+            request, view, api_key
+        )
+
+    def has_api_key_permission(
+        self, request: HttpRequest, view: typing.Any, api_key: AbstractAPIKey
+    ) -> bool:
+        """
+        Return whether the valid `api_key` grants access to `view`.
+        """
+        return True
+
+    def get_api_key(
+        self, request: HttpRequest, key: str
+    ) -> typing.Optional[AbstractAPIKey]:
+        assert self.model is not None
+
+        # API keys already validated by `APIKeyAuthentication` are reused.
+        authenticated = _get_authenticated_key(request, self.model, key)
+        if authenticated is not None:
+            return authenticated
+
+        # Validation results are memoized on the request, so that combining
+        # several API key permissions (or checking object permissions) costs
+        # at most one lookup per model.
+        memo = _get_request_memo(request)
+        memo_key = (self.model, key)
+
+        if memo_key not in memo:
+            started = time.perf_counter()
+            try:
+                api_key = self._validate_key(key)
+            except VerificationUnavailable:
+                raise KeyVerificationUnavailable()
+            outcome = "invalid" if api_key is None else "valid"
+            signals.send_event(self.model, "validate", outcome, started)
+            if api_key is not None:
+                deferred.record_usage(self.model, api_key.pk)
+            memo[memo_key] = api_key
+
+        return memo[memo_key]
+
+    def _validate_key(self, key: str) -> typing.Optional[AbstractAPIKey]:
+        assert self.model is not None
+        return self.model.objects.get_valid_key(key)
 
     def has_object_permission(
         self, request: HttpRequest, view: typing.Any, obj: AbstractAPIKey
@@ -79,3 +233,178 @@ class BaseHasAPIKey(permissions.BasePermission):
 
 class HasAPIKey(BaseHasAPIKey):
     model = APIKey
+
+
+class BaseHasAPIKeyWithScopes(BaseHasAPIKey):
+    """
+    Require the API key to have the scopes declared by the view.
+
+    Views declare their `required_scopes`, either as an iterable of scopes
+    (or a space-separated string), or as a dict mapping HTTP methods to
+    scopes (`"*"` applying to methods which are not listed). Methods which
+    are not listed, in a dict without `"*"`, are denied.
+    """
+
+    def get_required_scopes(
+        self, request: HttpRequest, view: typing.Any
+    ) -> typing.Optional[typing.FrozenSet[str]]:
+        """
+        Return the scopes required for the request, or `None` if the request
+        method is not allowed.
+        """
+        required_scopes = getattr(view, "required_scopes", None)
+
+        if required_scopes is None:
+            raise ImproperlyConfigured(
+                "%s requires views to declare `required_scopes`."
+                % self.__class__.__name__
+            )
+
+        if isinstance(required_scopes, dict):
+            required_scopes = required_scopes.get(
+                request.method, required_scopes.get("*")
+            )
+            if required_scopes is None:
+                return None
+
+        if isinstance(required_scopes, str):
+            return parse_scopes(required_scopes)
+
+        return frozenset(required_scopes)
+
+    def has_api_key_permission(
+        self, request: HttpRequest, view: typing.Any, api_key: AbstractAPIKey
+    ) -> bool:
+        required_scopes = self.get_required_scopes(request, view)
+        return required_scopes is not None and api_key.has_scopes(required_scopes)
+
+
+class HasAPIKeyWithScopes(BaseHasAPIKeyWithScopes):
+    model = APIKey
+
+
+def _mark_coroutine_function(func: typing.Callable) -> typing.Callable:
+    # Let callers such as `adrf` know that they must await the result.
+    if hasattr(inspect, "markcoroutinefunction"):  # pragma: no cover
+        return inspect.markcoroutinefunction(func)  # Python 3.12+
+    func._is_coroutine = asyncio.coroutines._is_coroutine  # type: ignore
+    return func
+
+
+class _PermissionCheck:
+    """
+    The awaitable result of an async permission check.
+
+    Using it as a boolean (e.g. from a synchronous caller which doesn't await
+    it) raises an error instead of granting access.
+    """
+
+    def __init__(self, coroutine: typing.Coroutine[typing.Any, typing.Any, bool]):
+        self._coroutine = coroutine
+
+    def __await__(self) -> typing.Generator[typing.Any, None, bool]:
+        return self._coroutine.__await__()
+
+    def __bool__(self) -> bool:
+        self._coroutine.close()
+        raise TypeError("Async permission checks must be awaited.")
+
+
+class _AsyncPermissionMetaclass(permissions.BasePermissionMetaclass):
+    # DRF evaluates composed permissions synchronously, which would not
+    # await the permission checks.
+    def _compose(cls, *args: typing.Any) -> typing.NoReturn:
+        raise TypeError(
+            "%s can't be composed with the |, & and ~ operators." % cls.__name__
+        )
+
+    __and__ = __or__ = __rand__ = __ror__ = __invert__ = _compose
+
+
+class BaseAsyncHasAPIKey(BaseHasAPIKey, metaclass=_AsyncPermissionMetaclass):
+    """
+    A variant of `BaseHasAPIKey` whose permission checks are awaitable,
+    for use in async views (e.g. built with `adrf`).
+
+    Permission checks raise `ImproperlyConfigured` in synchronous views,
+    which would not await them.
+    """
+
+    def _check_view(self, view: typing.Any) -> None:
+        if not getattr(view, "view_is_async", False):
+            raise ImproperlyConfigured(
+                "%s can only be used in async views." % self.__class__.__name__
+            )
+
+    @_mark_coroutine_function
+    def has_permission(  # type: ignore[override]
+        self, request: HttpRequest, view: typing.Any
+    ) -> typing.Awaitable[bool]:
+        self._check_view(view)
+        return _PermissionCheck(self.ahas_permission(request, view))
+
+    async def ahas_permission(self, request: HttpRequest, view: typing.Any) -> bool:
+        assert self.model is not None, (
+            "%s must define `.model` with the API key model to use"
+            % self.__class__.__name__
+        )
+        started = time.perf_counter()
+        key = self.get_key(request)
+        outcome = "found" if key else "not_found"
+        signals.send_event(self.model, "parse", outcome, started)
+        if not key:
+            return False
+        api_key = await self.aget_api_key(request, key)
+        return api_key is not None and self.has_api_key_permission(
+            request, view, api_key
+        )
+
+    async def aget_api_key(
+        self, request: HttpRequest, key: str
+    ) -> typing.Optional[AbstractAPIKey]:
+        assert self.model is not None
+
+        authenticated = _get_authenticated_key(request, self.model, key)
+        if authenticated is not None:
+            return authenticated
+
+        memo = _get_request_memo(request)
+        memo_key = (self.model, key)
+
+        if memo_key not in memo:
+            started = time.perf_counter()
+            try:
+                api_key = await self._avalidate_key(key)
+            except VerificationUnavailable:
+                raise KeyVerificationUnavailable()
+            outcome = "invalid" if api_key is None else "valid"
+            signals.send_event(self.model, "validate", outcome, started)
+            if api_key is not None:
+                deferred.record_usage(self.model, api_key.pk)
+            memo[memo_key] = api_key
+
+        return memo[memo_key]
+
+    async def _avalidate_key(self, key: str) -> typing.Optional[AbstractAPIKey]:
+        assert self.model is not None
+        return await self.model.objects.aget_valid_key(key)
+
+    @_mark_coroutine_function
+    def has_object_permission(  # type: ignore[override]
+        self, request: HttpRequest, view: typing.Any, obj: AbstractAPIKey
+    ) -> typing.Awaitable[bool]:
+        self._check_view(view)
+        return _PermissionCheck(self.ahas_object_permission(request, view, obj))
+
+    async def ahas_object_permission(
+        self, request: HttpRequest, view: typing.Any, obj: AbstractAPIKey
+    ) -> bool:
+        if _drf_version < _3_14_0:  # pragma: no cover
+            # See `BaseHasAPIKey.has_object_permission()`.
+            return await self.ahas_permission(request, view)
+
+        return True
+
+
+class AsyncHasAPIKey(BaseAsyncHasAPIKey):
+    model = APIKey
@@ -0,0 +1,122 @@
+"""
+Per-key rate limits, and stores counting requests to enforce them.
+
+Rates use the same format as DRF throttle rates, e.g. "100/min" or
+"10000/day".
+"""
+import collections
+import threading
+import time
+import typing
+
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+
+_DURATIONS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate: str) -> typing.Tuple[int, int]:
+    """
+    Return the number of allowed requests and the period in seconds of `rate`.
+
+    Raise `ValueError` if `rate` is not valid.
+    """
+    num, _, period = rate.partition("/")
+
+    if not num.isdigit() or not period or period[0] not in _DURATIONS:
+        raise ValueError(f"Invalid rate: {rate!r}")
+
+    return int(num), _DURATIONS[period[0]]
+
+
+def validate_rate(value: str) -> None:
+    try:
+        parse_rate(value)
+    except ValueError:
+        raise ValidationError(
+            _('Enter a rate such as "100/min" (per second, minute, hour or day).'),
+            code="invalid_rate",
+        )
+
+
+class BaseRateStore:
+    """
+    Count requests made with API keys.
+    """
+
+    def hit(self, key: str, limit: int, duration: int) -> typing.Optional[float]:
+        """
+        Record a request for `key`, unless `limit` requests were already
+        recorded in the last `duration` seconds.
+
+        Return `None` if the request is allowed, or how many seconds to wait
+        before the next request is allowed.
+        """
+        raise NotImplementedError
+
+
+class InMemoryRateStore(BaseRateStore):
+    """
+    Count requests in a process-local sliding window.
+
+    Limits are enforced per process. This store keeps the time of up to
+    `limit` requests per key, so prefer it for short periods.
+    """
+
+    def __init__(self) -> None:
+        self._hits: typing.DefaultDict[
+            typing.Tuple[str, int], typing.Deque[float]
+        ] = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, duration: int) -> typing.Optional[float]:
+        now = time.monotonic()
+
+        with self._lock:
+            hits = self._hits[(key, duration)]
+
+            while hits and hits[0] <= now - duration:
+                hits.popleft()
+
+            if len(hits) >= limit:
+                return hits[0] + duration - now
+
+            hits.append(now)
+            return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hits.clear()
+
+
+class CacheRateStore(BaseRateStore):
+    """
+    Count requests in fixed windows of a Django cache shared by all processes,
+    using atomic increments.
+
+    Increments are atomic with cache backends such as Redis or Memcached,
+    but not with the database or file-based backends.
+    """
+
+    def __init__(self, alias: str = "default") -> None:
+        self.alias = alias
+
+    def hit(self, key: str, limit: int, duration: int) -> typing.Optional[float]:
+        cache = caches[self.alias]
+        now = time.time()
+        window = int(now // duration)
+        cache_key = f"api_key_rate:{key}:{duration}:{window}"
+
+        cache.add(cache_key, 0, timeout=duration)
+
+        try:
+            count = cache.incr(cache_key)
+        except ValueError:  # Expired or evicted since it was added.
+            cache.set(cache_key, 1, timeout=duration)
+            count = 1
+
+        if count > limit:
+            return (window + 1) * duration - now
+
+        return None
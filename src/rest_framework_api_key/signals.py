@@ -0,0 +1,24 @@
+"""
+Signals sent while validating API keys, e.g. to collect metrics.
+"""
+import time
+import typing
+
+from django.dispatch import Signal
+
+# Sent with the API key model as sender, and the following arguments:
+# - `event`: "parse", "cache", "lookup", "verify", "upgrade" or "validate".
+# - `outcome`: the result of the event, e.g. "hit" or "miss" for "cache".
+# - `duration`: how long the event took, in seconds.
+api_key_event = Signal()
+
+
+def send_event(sender: typing.Any, event: str, outcome: str, started: float) -> None:
+    """
+    Send `api_key_event`, timed from `started`, a `time.perf_counter()` value.
+    """
+    if api_key_event.receivers:
+        duration = time.perf_counter() - started
+        api_key_event.send(
+            sender=sender, event=event, outcome=outcome, duration=duration
+        )
@@ -0,0 +1,66 @@
+import typing
+
+from django.http import HttpRequest
+from rest_framework.throttling import BaseThrottle
+
+from .models import AbstractAPIKey
+from .permissions import BaseHasAPIKey, HasAPIKey
+from .rates import BaseRateStore, CacheRateStore, parse_rate
+
+
+class BaseAPIKeyRateThrottle(BaseThrottle):
+    """
+    Throttle requests according to the `rate_limit` and `quota` of their
+    API key.
+
+    The API key is validated with `permission_class`, whose results are
+    memoized on the request: when used along with that permission class,
+    throttling does not look the API key up again. Requests without a valid
+    API key are not throttled.
+    """
+
+    permission_class: typing.Type[BaseHasAPIKey] = HasAPIKey
+    store: BaseRateStore = CacheRateStore()
+    rate_fields = ("rate_limit", "quota")
+
+    def __init__(self) -> None:
+        self._wait: typing.Optional[float] = None
+
+    def get_api_key(self, request: HttpRequest) -> typing.Optional[AbstractAPIKey]:
+        permission = self.permission_class()
+        key = permission.get_key(request)
+        if not key:
+            return None
+        return permission.get_api_key(request, key)
+
+    def get_store_key(self, api_key: AbstractAPIKey, field: str) -> str:
+        return f"{api_key._meta.label_lower}:{api_key.prefix}:{field}"
+
+    def allow_request(self, request: HttpRequest, view: typing.Any) -> bool:
+        api_key = self.get_api_key(request)
+
+        if api_key is None:
+            return True
+
+        for field in self.rate_fields:
+            rate = getattr(api_key, field)
+
+            if not rate:
+                continue
+
+            limit, duration = parse_rate(rate)
+            store_key = self.get_store_key(api_key, field)
+            wait = self.store.hit(store_key, limit, duration)
+
+            if wait is not None:
+                self._wait = wait
+                return False
+
+        return True
+
+    def wait(self) -> typing.Optional[float]:
+        return self._wait
+
+
+class APIKeyRateThrottle(BaseAPIKeyRateThrottle):
+    pass
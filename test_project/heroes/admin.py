@@ -2,7 +2,7 @@ from django.contrib import admin
 
 from rest_framework_api_key.admin import APIKeyModelAdmin
 
-from .models import Hero, HeroAPIKey
+from .models import CompactHeroAPIKey, Hero, HeroAPIKey
 
 
 @admin.register(HeroAPIKey)
@@ -10,6 +10,11 @@ class HeroAPIKeyModelAdmin(APIKeyModelAdmin):
     pass
 
 
+@admin.register(CompactHeroAPIKey)
+class CompactHeroAPIKeyModelAdmin(APIKeyModelAdmin):
+    pass
+
+
 @admin.register(Hero)
 class HeroModelAdmin(admin.ModelAdmin):
     pass
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("heroes", "0004_auto_20220110_1102"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="heroapikey",
+            index=models.Index(
+                fields=["prefix", "revoked", "expiry_date"],
+                name="heroes_hero_prefix_4c0855_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import rest_framework_api_key.fields
+from rest_framework_api_key.operations import CopyAPIKeys
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("heroes", "0005_heroapikey_heroes_hero_prefix_4c0855_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompactHeroAPIKey",
+            fields=[
+                ("prefix", models.CharField(editable=False, max_length=8, unique=True)),
+                ("created", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "name",
+                    models.CharField(
+                        default=None,
+                        help_text=(
+                            "A free-form name for the API key. Need not be unique. "
+                            "50 characters max."
+                        ),
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "revoked",
+                    models.BooleanField(
+                        blank=True,
+                        default=False,
+                        help_text=(
+                            "If the API key is revoked, clients cannot use it anymore. "
+                            "(This cannot be undone.)"
+                        ),
+                    ),
+                ),
+                (
+                    "expiry_date",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text=(
+                            "Once API key expires, clients cannot use it anymore."
+                        ),
+                        null=True,
+                        verbose_name="Expires",
+                    ),
+                ),
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "hashed_key",
+                    rest_framework_api_key.fields.HashedKeyField(max_length=150),
+                ),
+                (
+                    "hero",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="compact_api_keys",
+                        to="heroes.hero",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Compact hero API key",
+                "verbose_name_plural": "Compact hero API keys",
+                "ordering": ("-created",),
+                "abstract": False,
+                "indexes": [
+                    models.Index(
+                        fields=["prefix", "revoked", "expiry_date"],
+                        name="heroes_comp_prefix_c1afab_idx",
+                    )
+                ],
+            },
+        ),
+        # Move existing API keys to the compact model.
+        CopyAPIKeys("heroes.HeroAPIKey", "heroes.CompactHeroAPIKey"),
+    ]
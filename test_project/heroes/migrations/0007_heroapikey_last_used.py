@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("heroes", "0006_compactheroapikey"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="compactheroapikey",
+            name="last_used",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text=(
+                    "When the API key was last used. "
+                    "Only tracked if API_KEY_LAST_USED_INTERVAL is set."
+                ),
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="heroapikey",
+            name="last_used",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text=(
+                    "When the API key was last used. "
+                    "Only tracked if API_KEY_LAST_USED_INTERVAL is set."
+                ),
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+import rest_framework_api_key.rates
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("heroes", "0007_heroapikey_last_used"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="compactheroapikey",
+            name="quota",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text=(
+                    "Maximum number of requests over a longer period, "
+                    'e.g. "10000/day". '
+                    "Leave empty for no quota."
+                ),
+                max_length=20,
+                validators=[rest_framework_api_key.rates.validate_rate],
+            ),
+        ),
+        migrations.AddField(
+            model_name="compactheroapikey",
+            name="rate_limit",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text=(
+                    'Maximum request rate, e.g. "10/s" or "100/min". '
+                    "Leave empty for no limit."
+                ),
+                max_length=20,
+                validators=[rest_framework_api_key.rates.validate_rate],
+            ),
+        ),
+        migrations.AddField(
+            model_name="heroapikey",
+            name="quota",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text=(
+                    "Maximum number of requests over a longer period, "
+                    'e.g. "10000/day". '
+                    "Leave empty for no quota."
+                ),
+                max_length=20,
+                validators=[rest_framework_api_key.rates.validate_rate],
+            ),
+        ),
+        migrations.AddField(
+            model_name="heroapikey",
+            name="rate_limit",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text=(
+                    'Maximum request rate, e.g. "10/s" or "100/min". '
+                    "Leave empty for no limit."
+                ),
+                max_length=20,
+                validators=[rest_framework_api_key.rates.validate_rate],
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("heroes", "0008_heroapikey_rate_limit_quota"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="compactheroapikey",
+            name="scopes",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text=(
+                    "Space-separated scopes granted to the API key, "
+                    'e.g. "heroes:read heroes:write".'
+                ),
+                max_length=255,
+            ),
+        ),
+        migrations.AddField(
+            model_name="heroapikey",
+            name="scopes",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text=(
+                    "Space-separated scopes granted to the API key, "
+                    'e.g. "heroes:read heroes:write".'
+                ),
+                max_length=255,
+            ),
+        ),
+    ]
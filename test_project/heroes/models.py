@@ -1,6 +1,10 @@
 from django.db import models
 
-from rest_framework_api_key.models import AbstractAPIKey, BaseAPIKeyManager
+from rest_framework_api_key.models import (
+    AbstractAPIKey,
+    AbstractCompactAPIKey,
+    BaseAPIKeyManager,
+)
 
 
 class Hero(models.Model):
@@ -16,6 +20,8 @@ class Hero(models.Model):
 
 
 class HeroAPIKeyManager(BaseAPIKeyManager):
+    validation_select_related = ("hero",)
+
     def get_usable_keys(self) -> models.QuerySet:
         return super().get_usable_keys().filter(hero__retired=False)
 
@@ -27,3 +33,14 @@ class HeroAPIKey(AbstractAPIKey):
     class Meta(AbstractAPIKey.Meta):
         verbose_name = "Hero API key"
         verbose_name_plural = "Hero API keys"
+
+
+class CompactHeroAPIKey(AbstractCompactAPIKey):
+    objects = HeroAPIKeyManager()
+    hero = models.ForeignKey(
+        Hero, on_delete=models.CASCADE, related_name="compact_api_keys"
+    )
+
+    class Meta(AbstractCompactAPIKey.Meta):
+        verbose_name = "Compact hero API key"
+        verbose_name_plural = "Compact hero API keys"
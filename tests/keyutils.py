@@ -0,0 +1,6 @@
+def wrong_key(key: str) -> str:
+    """
+    Return a key of the same length as `key`, with a wrong secret, so that it
+    is not rejected as malformed before being hashed.
+    """
+    return key[:-1] + ("y" if key.endswith("x") else "x")
@@ -0,0 +1,397 @@
+import datetime as dt
+import threading
+from typing import Any, Callable, Dict, Iterator
+from unittest import mock
+
+import django
+import pytest
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.hashers import make_password
+from django.core.cache import BaseCache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from test_project.heroes.models import Hero, HeroAPIKey
+
+from rest_framework_api_key import cache, deferred
+from rest_framework_api_key.crypto import (
+    Blake2bApiKeyHasher,
+    KeyGenerator,
+    get_password_executor,
+)
+from rest_framework_api_key.models import APIKey
+from rest_framework_api_key.permissions import (
+    AsyncHasAPIKey,
+    HasAPIKey,
+    KeyVerificationUnavailable,
+)
+
+from .dateutils import TOMORROW, YESTERDAY
+
+UNKNOWN_KEY = "abcdefgh." + "x" * 32
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(
+        django.VERSION < (4, 2), reason="Async ORM requires Django 4.2+"
+    ),
+]
+
+
+class AsyncView(APIView):
+    async def get(self, request: Request) -> Response:
+        return Response()  # pragma: no cover
+
+
+class SyncView(APIView):
+    permission_classes = [AsyncHasAPIKey]
+
+    def get(self, request: Request) -> Response:
+        return Response()  # pragma: no cover
+
+
+async_view = AsyncView()
+
+
+def run(coroutine_function: Callable, *args: Any, **kwargs: Any) -> Any:
+    return async_to_sync(coroutine_function)(*args, **kwargs)
+
+
+@pytest.fixture(params=["no-cache", "local", "shared", "local+shared"])
+def caching(request: pytest.FixtureRequest) -> Iterator[None]:
+    overrides: Dict[str, Any] = {"API_KEY_CACHE_NEGATIVE_TTL": 5}
+
+    if "local" in request.param:
+        overrides["API_KEY_CACHE_SIZE"] = 16
+
+    if "shared" in request.param:
+        overrides["API_KEY_CACHE_ALIAS"] = "default"
+
+    shared_cache: BaseCache = caches["default"]
+    shared_cache.clear()
+
+    with override_settings(**overrides):
+        yield
+
+    shared_cache.clear()
+
+
+def test_acreate_key() -> None:
+    api_key, key = run(APIKey.objects.acreate_key, name="test")
+    assert APIKey.objects.get_from_key(key) == api_key
+
+
+def test_aget_from_key(caching: None) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+
+    for _ in range(2):
+        assert run(APIKey.objects.aget_from_key, key) == api_key
+
+    for _ in range(2):
+        with pytest.raises(APIKey.DoesNotExist):
+            run(APIKey.objects.aget_from_key, f"{api_key.prefix}.{'x' * 32}")
+
+    for _ in range(2):
+        with pytest.raises(APIKey.DoesNotExist):
+            run(APIKey.objects.aget_from_key, UNKNOWN_KEY)
+
+
+def test_aget_from_key_select_related(
+    caching: None, django_assert_num_queries: Callable
+) -> None:
+    hero = Hero.objects.create(name="Batman")
+    _, key = HeroAPIKey.objects.create_key(name="test", hero=hero)
+    manager = HeroAPIKey.objects
+
+    with mock.patch.object(manager, "validation_select_related", ()):
+        run(manager.aget_from_key, key)
+
+        with django_assert_num_queries(1):
+            api_key = run(manager.aget_from_key, key, select_related=["hero"])
+            assert api_key.hero == hero
+
+
+def test_aget_from_key_checks_cached_key_expiry(
+    caching: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _, key = APIKey.objects.create_key(name="test", expiry_date=TOMORROW)
+    run(APIKey.objects.aget_from_key, key)
+
+    monkeypatch.setattr(timezone, "now", lambda: TOMORROW + dt.timedelta(seconds=1))
+    with pytest.raises(APIKey.DoesNotExist):
+        run(APIKey.objects.aget_from_key, key)
+
+
+def test_aget_valid_key(caching: None) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+
+    for _ in range(2):
+        assert run(APIKey.objects.aget_valid_key, key) == api_key
+
+    for _ in range(2):
+        assert (
+            run(APIKey.objects.aget_valid_key, f"{api_key.prefix}.{'x' * 32}") is None
+        )
+
+    for _ in range(2):
+        assert run(APIKey.objects.aget_valid_key, UNKNOWN_KEY) is None
+
+
+def test_avalidate_many() -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    _, revoked_key = APIKey.objects.create_key(name="test", revoked=True)
+    keys = [key, revoked_key, f"{api_key.prefix}.{'x' * 32}", UNKNOWN_KEY]
+
+    assert run(APIKey.objects.avalidate_many, keys, batch_size=2) == {
+        key: api_key,
+        revoked_key: None,
+        f"{api_key.prefix}.{'x' * 32}": None,
+        UNKNOWN_KEY: None,
+    }
+
+
+def test_aget_from_key_shared_cache_version_evicted(caching: None) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    caches["default"].clear()
+    assert run(APIKey.objects.aget_from_key, key) == api_key
+
+
+def test_aget_from_key_shared_cache_populates_local_cache(caching: None) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    assert run(APIKey.objects.aget_from_key, key) == api_key
+
+    # Simulate another process, which only shares the shared cache.
+    local_cache = cache.get_local_cache()
+    if local_cache is not None:
+        local_cache.clear()
+
+    assert run(APIKey.objects.aget_from_key, key) == api_key
+
+
+@override_settings(API_KEY_CACHE_ALIAS="default")
+def test_astore_ignores_stale_store() -> None:
+    api_key, _ = APIKey.objects.create_key(name="test")
+    caches["default"].clear()
+
+    _, version = run(cache.alookup, APIKey.objects, api_key.prefix)
+    api_key.revoked = True
+    api_key.save()
+    run(cache.astore, APIKey.objects, api_key, version)
+
+    cached, _ = run(cache.alookup, APIKey.objects, api_key.prefix)
+    assert cached is None
+
+
+@pytest.mark.parametrize(
+    "expiry_date, revoked, valid",
+    [
+        (None, False, True),
+        (TOMORROW, False, True),
+        (YESTERDAY, False, False),
+        (None, True, False),
+    ],
+)
+def test_ais_valid(expiry_date: dt.datetime, revoked: bool, valid: bool) -> None:
+    _, key = APIKey.objects.create_key(
+        name="test", expiry_date=expiry_date, revoked=revoked
+    )
+    assert run(APIKey.objects.ais_valid, key) is valid
+
+
+def test_ais_valid_upgrades_hasher(caching: None) -> None:
+    key_generator = APIKey.objects.key_generator
+    api_key, key = APIKey.objects.create_key(name="test")
+    api_key.hashed_key = make_password(key)
+    api_key.save()
+
+    assert run(api_key.ais_valid, key)
+    api_key.refresh_from_db()
+    assert key_generator.using_preferred_hasher(api_key.hashed_key)
+
+
+@override_settings(API_KEY_DEFER_HASHER_UPGRADES=True)
+def test_ais_valid_defers_hasher_upgrade() -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    legacy_hashed_key = make_password(key)
+    APIKey.objects.filter(pk=api_key.pk).update(hashed_key=legacy_hashed_key)
+    api_key.refresh_from_db()
+
+    assert run(api_key.ais_valid, key)
+    assert APIKey.objects.get(pk=api_key.pk).hashed_key == legacy_hashed_key
+
+    assert deferred.flush_hasher_upgrades() == 1
+    assert APIKey.objects.get(pk=api_key.pk).hashed_key == api_key.hashed_key
+
+
+def test_aupgrade_hashed_key_concurrent_change() -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    upgraded = run(
+        APIKey.objects.aupgrade_hashed_key,
+        api_key.pk,
+        api_key.prefix,
+        "changed",
+        "new",
+    )
+    assert not upgraded
+
+
+def test_async_permission(rf: RequestFactory) -> None:
+    _, key = APIKey.objects.create_key(name="test")
+    permission = AsyncHasAPIKey()
+
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+    assert run(permission.has_permission, request, async_view) is True
+    assert run(permission.has_object_permission, request, async_view, object()) is True
+
+    request = rf.get("/test/", HTTP_AUTHORIZATION="Api-Key abcd.efgh")
+    assert run(permission.has_permission, request, async_view) is False
+
+    request = rf.get("/test/")
+    assert run(permission.has_permission, request, async_view) is False
+
+
+def test_async_permission_detected_as_coroutine_function() -> None:
+    permission = AsyncHasAPIKey()
+    assert iscoroutinefunction(permission.has_permission)
+    assert iscoroutinefunction(permission.has_object_permission)
+
+
+def test_async_permission_rejects_sync_views(rf: RequestFactory) -> None:
+    _, key = APIKey.objects.create_key(name="test")
+
+    for request in [
+        rf.get("/test/"),
+        rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"),
+    ]:
+        with pytest.raises(ImproperlyConfigured):
+            SyncView.as_view()(request)
+
+    with pytest.raises(ImproperlyConfigured):
+        AsyncHasAPIKey().has_object_permission(rf.get("/test/"), SyncView(), object())
+
+
+def test_async_permission_cannot_be_composed() -> None:
+    with pytest.raises(TypeError):
+        AsyncHasAPIKey | IsAdminUser
+    with pytest.raises(TypeError):
+        IsAdminUser | AsyncHasAPIKey
+    with pytest.raises(TypeError):
+        AsyncHasAPIKey & IsAdminUser
+    with pytest.raises(TypeError):
+        IsAdminUser & AsyncHasAPIKey
+    with pytest.raises(TypeError):
+        ~AsyncHasAPIKey
+
+
+def test_async_permission_check_not_awaited(rf: RequestFactory) -> None:
+    # Nested compositions bypass the metaclass, but never grant access.
+    composed: Any = HasAPIKey | HasAPIKey
+    composed = composed | AsyncHasAPIKey
+    request = rf.get("/test/")
+
+    with pytest.raises(TypeError):
+        bool(composed().has_permission(request, async_view))
+
+
+def test_async_permission_expired(rf: RequestFactory) -> None:
+    _, key = APIKey.objects.create_key(name="test", expiry_date=YESTERDAY)
+    permission = AsyncHasAPIKey()
+
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+    assert run(permission.has_permission, request, async_view) is False
+
+
+def test_async_permission_memoized(
+    rf: RequestFactory, django_assert_num_queries: Callable
+) -> None:
+    _, key = APIKey.objects.create_key(name="test")
+    permission = AsyncHasAPIKey()
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+
+    with django_assert_num_queries(1):
+        assert run(permission.has_permission, request, async_view) is True
+        assert run(permission.has_permission, request, async_view) is True
+
+
+@pytest.mark.parametrize("concurrency", [0, 1])
+def test_averify(concurrency: int) -> None:
+    key_generator = KeyGenerator()
+
+    with override_settings(API_KEY_PASSWORD_HASHER_CONCURRENCY=concurrency):
+        assert run(key_generator.averify, "test", key_generator.hash("test"))
+        hashed_key = Blake2bApiKeyHasher().encode("test", "")
+        assert run(key_generator.averify, "test", hashed_key)
+        hashed_key = make_password("test", hasher="pbkdf2_sha1")
+        assert run(key_generator.averify, "test", hashed_key)
+        assert not run(key_generator.averify, "not-test", hashed_key)
+
+
+@override_settings(API_KEY_PASSWORD_HASHER_CONCURRENCY=1)
+def test_averify_runs_password_hashers_in_thread_pool() -> None:
+    executor = get_password_executor()
+    assert executor is not None
+    thread_names = []
+
+    def verify(key: str, hashed_key: str, hasher: Any) -> bool:
+        thread_names.append(threading.current_thread().name)
+        return True
+
+    assert run(executor.arun, verify, "test", "hashed", None)
+    assert thread_names[0].startswith("rest_framework_api_key")
+
+
+def test_async_permission_verification_unavailable(rf: RequestFactory) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    APIKey.objects.filter(pk=api_key.pk).update(hashed_key=make_password(key))
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+
+    with override_settings(
+        API_KEY_PASSWORD_HASHER_CONCURRENCY=1, API_KEY_PASSWORD_HASHER_TIMEOUT=0
+    ):
+        executor = get_password_executor()
+        assert executor is not None
+        assert executor._semaphore.acquire()
+        try:
+            with pytest.raises(KeyVerificationUnavailable):
+                run(AsyncHasAPIKey().has_permission, request, async_view)
+        finally:
+            executor._semaphore.release()
+
+
+def test_ais_valid_custom_key_generator() -> None:
+    class CustomKeyGenerator:
+        def verify(self, key: str, hashed_key: str) -> bool:
+            return key == hashed_key
+
+        def using_preferred_hasher(self, hashed_key: str) -> bool:
+            return True
+
+    api_key = APIKey(hashed_key="sha512$$test")
+
+    with mock.patch.object(APIKey.objects, "key_generator", CustomKeyGenerator()):
+        assert run(api_key.ais_valid, "sha512$$test")
+
+
+def test_async_permission_reuses_authenticated_key(
+    rf: RequestFactory, django_assert_num_queries: Callable
+) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+    request.auth = api_key  # type: ignore
+
+    with django_assert_num_queries(0):
+        assert run(AsyncHasAPIKey().has_permission, request, async_view)
+
+
+def test_async_manager_rejects_malformed_keys(
+    django_assert_num_queries: Callable,
+) -> None:
+    with django_assert_num_queries(0):
+        assert run(APIKey.objects.aget_valid_key, "abcd.efgh") is None
+        assert run(APIKey.objects.avalidate_many, ["abcd.efgh"]) == {"abcd.efgh": None}
+        with pytest.raises(APIKey.DoesNotExist):
+            run(APIKey.objects.aget_from_key, "abcd.efgh")
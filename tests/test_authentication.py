@@ -0,0 +1,183 @@
+import datetime as dt
+from typing import Callable
+
+import pytest
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+    throttle_classes,
+)
+from rest_framework.request import Request
+from rest_framework.response import Response
+from test_project.heroes.models import Hero, HeroAPIKey
+from test_project.heroes.permissions import HasHeroAPIKey
+
+from rest_framework_api_key import deferred
+from rest_framework_api_key.authentication import (
+    APIKeyAuthentication,
+    BaseAPIKeyAuthentication,
+)
+from rest_framework_api_key.crypto import get_password_executor
+from rest_framework_api_key.models import APIKey
+from rest_framework_api_key.permissions import HasAPIKey
+from rest_framework_api_key.throttling import APIKeyRateThrottle
+
+from .dateutils import TOMORROW, YESTERDAY
+from .keyutils import wrong_key
+
+pytestmark = pytest.mark.django_db
+
+
+class HeroAPIKeyAuthentication(BaseAPIKeyAuthentication):
+    model = HeroAPIKey
+    select_related = ("hero",)
+
+
+@api_view()
+@authentication_classes([APIKeyAuthentication])
+@permission_classes([HasAPIKey])
+@throttle_classes([APIKeyRateThrottle])
+def view(request: Request) -> Response:
+    assert isinstance(request.auth, APIKey)
+    assert isinstance(request.user, AnonymousUser)
+    return Response({"name": request.auth.name})
+
+
+@api_view()
+@authentication_classes([HeroAPIKeyAuthentication])
+@permission_classes([HasHeroAPIKey])
+def hero_view(request: Request) -> Response:
+    return Response({"hero": request.auth.hero.name})
+
+
+def test_authentication(
+    rf: RequestFactory, django_assert_num_queries: Callable
+) -> None:
+    _, key = APIKey.objects.create_key(name="test", rate_limit="10/min")
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+
+    # Permission and throttling reuse the authenticated API key.
+    with django_assert_num_queries(1):
+        response = view(request)
+
+    assert response.status_code == 200
+    assert response.data == {"name": "test"}
+
+
+def test_authentication_invalid_key(rf: RequestFactory) -> None:
+    response = view(rf.get("/test/", HTTP_AUTHORIZATION="Api-Key abcd.efgh"))
+    assert response.status_code == 401
+    assert response["WWW-Authenticate"] == "Api-Key"
+    assert response.data["detail"].code == "authentication_failed"
+
+
+def test_authentication_no_key(rf: RequestFactory) -> None:
+    response = view(rf.get("/test/"))
+    assert response.status_code == 401
+    assert response.data["detail"].code == "not_authenticated"
+
+
+def test_authentication_select_related(
+    rf: RequestFactory, django_assert_num_queries: Callable
+) -> None:
+    hero = Hero.objects.create(name="Batman")
+    _, key = HeroAPIKey.objects.create_key(name="test", hero=hero)
+
+    with django_assert_num_queries(1):
+        response = hero_view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+
+    assert response.status_code == 200
+    assert response.data == {"hero": "Batman"}
+
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {wrong_key(key)}")
+    assert hero_view(request).status_code == 401
+
+    # Malformed keys are rejected without querying the database.
+    with django_assert_num_queries(0):
+        response = hero_view(rf.get("/test/", HTTP_AUTHORIZATION="Api-Key abcd.efgh"))
+    assert response.status_code == 401
+
+
+def test_permission_ignores_other_authenticated_key(rf: RequestFactory) -> None:
+    _, key = APIKey.objects.create_key(name="test")
+    other_api_key, _ = APIKey.objects.create_key(name="test")
+    request = rf.get("/test/")
+    request.auth = other_api_key  # type: ignore
+
+    assert HasAPIKey().get_api_key(request, "abcd.efgh") is None
+    assert HasAPIKey().get_api_key(request, key) is not None
+
+
+@pytest.mark.parametrize(
+    "field, value", [("revoked", True), ("expiry_date", YESTERDAY)]
+)
+def test_permission_ignores_unusable_authenticated_key(
+    rf: RequestFactory, field: str, value: object
+) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    APIKey.objects.filter(pk=api_key.pk).revoke()
+    setattr(api_key, field, value)
+    request = rf.get("/test/")
+    request.auth = api_key  # type: ignore
+
+    assert HasAPIKey().get_api_key(request, key) is None
+
+
+@override_settings(API_KEY_CACHE_SIZE=16)
+def test_authentication_expired_cached_key(
+    rf: RequestFactory, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _, key = APIKey.objects.create_key(name="test", expiry_date=TOMORROW)
+
+    response = view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+    assert response.status_code == 200
+
+    # The key expires while cached.
+    expired = TOMORROW + dt.timedelta(seconds=1)
+    monkeypatch.setattr(timezone, "now", lambda: expired)
+    response = view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+    assert response.status_code == 401
+
+
+@override_settings(API_KEY_LAST_USED_INTERVAL=60)
+def test_authentication_records_usage(rf: RequestFactory) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+
+    view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+
+    assert deferred.flush_last_used() == 1
+
+
+@override_settings(REST_FRAMEWORK={"UNAUTHENTICATED_USER": None})
+def test_authentication_without_unauthenticated_user(rf: RequestFactory) -> None:
+    _, key = APIKey.objects.create_key(name="test")
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+
+    user, api_key = APIKeyAuthentication().authenticate(request)  # type: ignore
+
+    assert user is None
+    assert api_key.name == "test"
+
+
+def test_authentication_verification_unavailable(rf: RequestFactory) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    APIKey.objects.filter(pk=api_key.pk).update(hashed_key=make_password(key))
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+
+    with override_settings(
+        API_KEY_PASSWORD_HASHER_CONCURRENCY=1, API_KEY_PASSWORD_HASHER_TIMEOUT=0
+    ):
+        executor = get_password_executor()
+        assert executor is not None
+        assert executor._semaphore.acquire()
+        try:
+            response = view(request)
+        finally:
+            executor._semaphore.release()
+
+    assert response.status_code == 503
@@ -0,0 +1,88 @@
+import pathlib
+from typing import Any, List, Tuple
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework_api_key.backfill import backfill
+from rest_framework_api_key.models import APIKey
+
+pytestmark = pytest.mark.django_db
+
+
+def test_backfill() -> None:
+    for index in range(5):
+        APIKey.objects.create_key(name=f"test{index}")
+
+    batches: List[Tuple[Any, int]] = []
+
+    def update(api_key: APIKey) -> None:
+        api_key.name = api_key.name.upper()
+
+    updated = backfill(
+        APIKey.objects.all(),
+        update,
+        fields=["name"],
+        batch_size=2,
+        on_batch=lambda last_pk, size: batches.append((last_pk, size)),
+    )
+
+    pks = sorted(APIKey.objects.values_list("pk", flat=True))
+    assert updated == 5
+    assert batches == [(pks[1], 2), (pks[3], 2), (pks[4], 1)]
+    assert sorted(APIKey.objects.values_list("name", flat=True)) == [
+        "TEST0",
+        "TEST1",
+        "TEST2",
+        "TEST3",
+        "TEST4",
+    ]
+
+
+def test_backfill_resume() -> None:
+    for index in range(3):
+        APIKey.objects.create_key(name="test")
+
+    pks = sorted(APIKey.objects.values_list("pk", flat=True))
+
+    def update(api_key: APIKey) -> None:
+        api_key.name = "updated"
+
+    updated = backfill(APIKey.objects.all(), update, ["name"], start_after=pks[0])
+
+    assert updated == 2
+    assert APIKey.objects.get(pk=pks[0]).name == "test"
+    assert APIKey.objects.filter(name="updated").count() == 2
+
+
+def test_backfill_api_keys_command(tmp_path: pathlib.Path) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    APIKey.objects.filter(pk=api_key.pk).update(prefix="", hashed_key="")
+    checkpoint = tmp_path / "checkpoint"
+    args = ["--model", "rest_framework_api_key.APIKey"]
+
+    with CaptureQueriesContext(connection) as context:
+        call_command("backfill_api_keys", *args, "--checkpoint", str(checkpoint))
+
+    # Columns added by later versions are not loaded.
+    assert '"name"' not in context.captured_queries[0]["sql"]
+
+    api_key.refresh_from_db()
+    assert api_key.pk == f"{api_key.prefix}.{api_key.hashed_key}"
+    assert APIKey.objects.is_valid(key)
+    assert checkpoint.read_text() == api_key.pk
+
+    # Resumes after the checkpoint.
+    APIKey.objects.filter(pk=api_key.pk).update(prefix="", hashed_key="")
+    call_command("backfill_api_keys", *args, "--checkpoint", str(checkpoint))
+    assert APIKey.objects.get(pk=api_key.pk).prefix == ""
+
+    call_command("backfill_api_keys", *args)
+    assert APIKey.objects.get(pk=api_key.pk).prefix == api_key.prefix
+
+
+def test_backfill_api_keys_command_requires_model() -> None:
+    with pytest.raises(CommandError):
+        call_command("backfill_api_keys")
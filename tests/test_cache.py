@@ -0,0 +1,352 @@
+import datetime as dt
+from typing import Callable, Iterator, List
+from unittest import mock
+
+import pytest
+from django.core.cache import BaseCache, caches
+from django.db.models import QuerySet
+from django.test import override_settings
+from django.utils import timezone
+from test_project.heroes.models import Hero, HeroAPIKey
+
+from rest_framework_api_key import cache
+from rest_framework_api_key.cache import LocalKeyCache, get_local_cache
+from rest_framework_api_key.models import APIKey
+
+from .dateutils import TOMORROW, YESTERDAY
+
+# A well-formed key, which isn't rejected before being looked up.
+UNKNOWN_KEY = "abcdefgh." + "x" * 32
+
+
+@pytest.fixture
+def local_cache() -> Iterator[LocalKeyCache]:
+    with override_settings(API_KEY_CACHE_SIZE=16, API_KEY_CACHE_TTL=60):
+        local_cache = get_local_cache()
+        assert local_cache is not None
+        yield local_cache
+
+
+@pytest.fixture
+def shared_cache() -> Iterator[BaseCache]:
+    with override_settings(API_KEY_CACHE_ALIAS="default"):
+        caches["default"].clear()
+        yield caches["default"]
+        caches["default"].clear()
+
+
+@pytest.fixture
+def negative_cache() -> Iterator[None]:
+    with override_settings(API_KEY_CACHE_NEGATIVE_TTL=5):
+        yield
+
+
+def test_caches_disabled_by_default() -> None:
+    assert get_local_cache() is None
+    assert cache.get_local_negative_cache() is None
+    assert cache.get_shared_cache() is None
+
+
+def test_local_cache_get_set_delete() -> None:
+    local_cache = LocalKeyCache(maxsize=2, ttl=60)
+    assert local_cache.get("a") is None
+
+    local_cache.set("a", 1)
+    assert local_cache.get("a") == 1
+
+    local_cache.delete("a")
+    local_cache.delete("a")
+    assert local_cache.get("a") is None
+
+    local_cache.set("b", 2)
+    local_cache.clear()
+    assert len(local_cache) == 0
+
+
+def test_local_cache_evicts_least_recently_used() -> None:
+    local_cache = LocalKeyCache(maxsize=2, ttl=60)
+    local_cache.set("a", 1)
+    local_cache.set("b", 2)
+    local_cache.get("a")
+    local_cache.set("c", 3)
+
+    assert len(local_cache) == 2
+    assert local_cache.get("b") is None
+    assert local_cache.get("a") == 1
+    assert local_cache.get("c") == 3
+
+
+def test_local_cache_entries_expire() -> None:
+    local_cache = LocalKeyCache(maxsize=2, ttl=0)
+    local_cache.set("a", 1)
+    assert local_cache.get("a") is None
+    assert len(local_cache) == 0
+
+
+@pytest.mark.django_db
+def test_get_from_key_uses_cache(
+    local_cache: LocalKeyCache, django_assert_num_queries: Callable
+) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+
+    with django_assert_num_queries(1):
+        assert APIKey.objects.get_from_key(key) == api_key
+
+    with django_assert_num_queries(0):
+        cached = APIKey.objects.get_from_key(key)
+        assert cached == api_key
+        assert cached.name == "test"
+        assert APIKey.objects.is_valid(key)
+
+    with pytest.raises(APIKey.DoesNotExist):
+        APIKey.objects.get_from_key(f"{api_key.prefix}.{'x' * 32}")
+
+
+@pytest.mark.django_db
+def test_revoking_invalidates_cache(local_cache: LocalKeyCache) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    assert APIKey.objects.is_valid(key)
+
+    api_key.revoked = True
+    api_key.save()
+
+    assert not APIKey.objects.is_valid(key)
+
+
+@pytest.mark.django_db
+def test_deleting_invalidates_cache(local_cache: LocalKeyCache) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    assert APIKey.objects.is_valid(key)
+
+    api_key.delete()
+
+    assert not APIKey.objects.is_valid(key)
+
+
+@pytest.mark.django_db
+def test_get_from_key_uses_shared_cache(
+    shared_cache: BaseCache, django_assert_num_queries: Callable
+) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+
+    with django_assert_num_queries(1):
+        assert APIKey.objects.get_from_key(key) == api_key
+
+    with django_assert_num_queries(0):
+        assert APIKey.objects.get_from_key(key) == api_key
+
+    # Versions may be evicted from the shared cache.
+    shared_cache.clear()
+
+    with django_assert_num_queries(1):
+        assert APIKey.objects.get_from_key(key) == api_key
+
+    with django_assert_num_queries(0):
+        assert APIKey.objects.get_from_key(key) == api_key
+
+
+@pytest.mark.django_db
+def test_shared_cache_populates_local_cache(
+    shared_cache: BaseCache,
+    local_cache: LocalKeyCache,
+    django_assert_num_queries: Callable,
+) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    assert APIKey.objects.is_valid(key)
+
+    # Simulate another process, which only shares the shared cache.
+    local_cache.clear()
+
+    with django_assert_num_queries(0):
+        assert APIKey.objects.is_valid(key)
+    assert len(local_cache) == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("action", ["revoke", "expire", "delete"])
+def test_changes_invalidate_shared_cache(shared_cache: BaseCache, action: str) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    assert APIKey.objects.is_valid(key)
+
+    if action == "revoke":
+        api_key.revoked = True
+        api_key.save()
+    elif action == "expire":
+        api_key.expiry_date = YESTERDAY
+        api_key.save()
+    else:
+        api_key.delete()
+
+    assert not APIKey.objects.is_valid(key)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("evicted", [True, False])
+def test_shared_cache_ignores_stale_store(
+    shared_cache: BaseCache, evicted: bool
+) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    if evicted:
+        shared_cache.clear()
+
+    # A request reads the row, but the key is revoked before it populates the cache.
+    _, version = cache.lookup(APIKey.objects, api_key.prefix)
+    api_key.revoked = True
+    api_key.save()
+    cache.store(APIKey.objects, api_key, version)
+
+    cached, _ = cache.lookup(APIKey.objects, api_key.prefix)
+    assert cached is None
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("layers", [["local"], ["shared"], ["local", "shared"]])
+def test_not_found_cached(
+    request: pytest.FixtureRequest,
+    layers: List[str],
+    negative_cache: None,
+    django_assert_num_queries: Callable,
+) -> None:
+    for layer in layers:
+        request.getfixturevalue(f"{layer}_cache")
+
+    with django_assert_num_queries(1):
+        assert not APIKey.objects.is_valid(UNKNOWN_KEY)
+
+    with django_assert_num_queries(0):
+        assert not APIKey.objects.is_valid(UNKNOWN_KEY)
+        with pytest.raises(APIKey.DoesNotExist):
+            APIKey.objects.get_from_key(UNKNOWN_KEY)
+
+    # Creating an API key with this prefix invalidates the negative entry.
+    api_key = APIKey(name="test")
+    api_key.id = api_key.prefix = "abcdefgh"
+    api_key.hashed_key = APIKey.objects.key_generator.hash(UNKNOWN_KEY)
+    api_key.save()
+
+    assert APIKey.objects.is_valid(UNKNOWN_KEY)
+
+
+@pytest.mark.django_db
+def test_not_found_in_shared_cache_populates_local_cache(
+    local_cache: LocalKeyCache,
+    shared_cache: BaseCache,
+    negative_cache: None,
+    django_assert_num_queries: Callable,
+) -> None:
+    assert not APIKey.objects.is_valid(UNKNOWN_KEY)
+
+    # Simulate another process, which only shares the shared cache.
+    local_negative_cache = cache.get_local_negative_cache()
+    assert local_negative_cache is not None
+    local_negative_cache.clear()
+
+    with django_assert_num_queries(0):
+        assert not APIKey.objects.is_valid(UNKNOWN_KEY)
+    assert len(local_negative_cache) == 1
+
+
+@pytest.mark.django_db
+def test_not_found_not_cached_by_default(
+    local_cache: LocalKeyCache, django_assert_num_queries: Callable
+) -> None:
+    assert cache.get_local_negative_cache() is None
+
+    with django_assert_num_queries(2):
+        assert not APIKey.objects.is_valid(UNKNOWN_KEY)
+        assert not APIKey.objects.is_valid(UNKNOWN_KEY)
+
+
+@pytest.mark.django_db
+def test_partially_cached_key_is_fully_loaded(
+    local_cache: LocalKeyCache, django_assert_num_queries: Callable
+) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+
+    with django_assert_num_queries(1):
+        assert APIKey.objects.is_valid(key)
+
+    # Partially cached keys are not returned when a full API key is needed.
+    with django_assert_num_queries(1):
+        assert APIKey.objects.get_from_key(key).name == "test"
+
+    with django_assert_num_queries(0):
+        assert APIKey.objects.get_from_key(key).name == "test"
+        assert APIKey.objects.is_valid(key)
+
+
+@pytest.mark.django_db
+def test_cached_key_expiry_is_checked(
+    local_cache: LocalKeyCache, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _, key = APIKey.objects.create_key(name="test", expiry_date=TOMORROW)
+    assert APIKey.objects.is_valid(key)
+    assert len(local_cache) == 1
+
+    # The key expires while cached.
+    monkeypatch.setattr(timezone, "now", lambda: TOMORROW + dt.timedelta(seconds=1))
+    assert not APIKey.objects.is_valid(key)
+
+
+@pytest.mark.django_db
+def test_cached_key_expiry_is_checked_by_get_from_key(
+    local_cache: LocalKeyCache, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _, key = APIKey.objects.create_key(name="test", expiry_date=TOMORROW)
+    APIKey.objects.get_from_key(key)
+    assert len(local_cache) == 1
+
+    monkeypatch.setattr(timezone, "now", lambda: TOMORROW + dt.timedelta(seconds=1))
+    with pytest.raises(APIKey.DoesNotExist):
+        APIKey.objects.get_from_key(key)
+
+
+@pytest.mark.django_db
+def test_bulk_created_keys_invalidate_negative_entries(
+    local_cache: LocalKeyCache,
+    shared_cache: BaseCache,
+    negative_cache: None,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    assert not APIKey.objects.is_valid(UNKNOWN_KEY)
+
+    monkeypatch.setattr(APIKey.objects.key_generator, "get_prefix", lambda: "abcdefgh")
+    [(_, key)] = APIKey.objects.bulk_create_keys(1, name="test")
+
+    assert APIKey.objects.is_valid(key)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("layer", ["local", "shared"])
+def test_bulk_updates_invalidate_cache(
+    request: pytest.FixtureRequest, layer: str
+) -> None:
+    request.getfixturevalue(f"{layer}_cache")
+    api_key, key = APIKey.objects.create_key(name="test")
+    _, other_key = APIKey.objects.create_key(name="test")
+    assert APIKey.objects.is_valid(key)
+    assert APIKey.objects.is_valid(other_key)
+
+    assert APIKey.objects.filter(pk=api_key.pk).set_expiry(YESTERDAY) == 1
+    assert not APIKey.objects.is_valid(key)
+    assert APIKey.objects.is_valid(other_key)
+
+    assert APIKey.objects.all().revoke() == 2
+    assert not APIKey.objects.is_valid(other_key)
+
+
+@pytest.mark.django_db
+def test_bulk_updates_only_lock_api_keys(local_cache: LocalKeyCache) -> None:
+    hero = Hero.objects.create(name="Batman")
+    _, key = HeroAPIKey.objects.create_key(name="test", hero=hero)
+    assert HeroAPIKey.objects.is_valid(key)
+    select_for_update = QuerySet.select_for_update
+
+    with mock.patch.object(
+        QuerySet, "select_for_update", autospec=True, side_effect=select_for_update
+    ) as mocked:
+        assert HeroAPIKey.objects.filter(hero__name="Batman").revoke() == 1
+
+    # Tables joined by filters (e.g. through nullable relations) aren't locked.
+    assert mocked.call_args.kwargs == {"of": ("self",)}
+    assert not HeroAPIKey.objects.is_valid(key)
@@ -0,0 +1,102 @@
+from typing import Callable
+
+import pytest
+from django.contrib.auth.hashers import make_password
+from django.core import serializers
+from django.db import connection
+from test_project.heroes.models import CompactHeroAPIKey, Hero
+
+from rest_framework_api_key.fields import decode_hashed_key, encode_hashed_key
+
+from .keyutils import wrong_key
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def hero() -> Hero:
+    return Hero.objects.create()
+
+
+def _get_raw_hashed_key(api_key: CompactHeroAPIKey) -> bytes:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT hashed_key FROM heroes_compactheroapikey WHERE id = %s",
+            [api_key.pk],
+        )
+        (value,) = cursor.fetchone()
+    return bytes(value)
+
+
+@pytest.mark.parametrize(
+    "hashed_key, size",
+    [
+        ("sha512$$" + "ab" * 64, 72),
+        ("blake2b$$" + "ab" * 32, 41),
+        # Not stored in binary form.
+        ("", 0),
+        ("pbkdf2_sha256$1000$salt$hash", 28),
+        ("bcrypt_sha256$$2b$12$abcdef", 27),
+        ("sha512$$" + "AB" * 64, 136),
+        ("sha512$$abc", 11),
+        ("$$ab", 4),
+    ],
+)
+def test_encode_hashed_key(hashed_key: str, size: int) -> None:
+    value = encode_hashed_key(hashed_key)
+    assert len(value) == size
+    assert decode_hashed_key(value) == hashed_key
+
+
+def test_create_key(hero: Hero) -> None:
+    api_key, key = CompactHeroAPIKey.objects.create_key(name="test", hero=hero)
+    assert isinstance(api_key.pk, int)
+    assert api_key.hashed_key.startswith("sha512$$")
+    assert len(_get_raw_hashed_key(api_key)) == 72
+
+    api_key = CompactHeroAPIKey.objects.get(pk=api_key.pk)
+    assert api_key.hashed_key.startswith("sha512$$")
+    assert api_key.is_valid(key)
+    assert CompactHeroAPIKey.objects.is_valid(key)
+    assert CompactHeroAPIKey.objects.get_from_key(key) == api_key
+    assert not CompactHeroAPIKey.objects.is_valid(wrong_key(key))
+
+
+def test_bulk_create_keys(hero: Hero) -> None:
+    created = list(
+        CompactHeroAPIKey.objects.bulk_create_keys(3, name="test", hero=hero)
+    )
+    assert len(created) == 3
+
+    for _, key in created:
+        assert CompactHeroAPIKey.objects.is_valid(key)
+
+
+def test_hasher_upgrade(hero: Hero, django_assert_num_queries: Callable) -> None:
+    api_key, key = CompactHeroAPIKey.objects.create_key(name="test", hero=hero)
+    legacy_hashed_key = make_password(key)
+    CompactHeroAPIKey.objects.filter(pk=api_key.pk).update(hashed_key=legacy_hashed_key)
+    assert _get_raw_hashed_key(api_key) == legacy_hashed_key.encode()
+
+    with django_assert_num_queries(2):
+        assert CompactHeroAPIKey.objects.is_valid(key)
+
+    api_key.refresh_from_db()
+    assert api_key.hashed_key.startswith("sha512$$")
+    assert CompactHeroAPIKey.objects.is_valid(key)
+
+
+def test_default_hashed_key() -> None:
+    assert CompactHeroAPIKey().hashed_key == ""
+
+
+def test_serialization(hero: Hero) -> None:
+    api_key, _ = CompactHeroAPIKey.objects.create_key(name="test", hero=hero)
+
+    data = serializers.serialize("json", [api_key])
+    (obj,) = serializers.deserialize("json", data)
+    assert obj.object.hashed_key == api_key.hashed_key
+
+    field = CompactHeroAPIKey._meta.get_field("hashed_key")
+    assert field.to_python(memoryview(b"test")) == "test"
+    assert field.from_db_value(None, None, connection) is None
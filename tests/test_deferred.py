@@ -0,0 +1,181 @@
+from typing import Callable
+from unittest import mock
+
+import pytest
+from django.contrib.auth.hashers import make_password
+from django.core.signals import request_finished
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.request import Request
+from rest_framework.response import Response
+from test_project.heroes.models import Hero, HeroAPIKey
+
+from rest_framework_api_key import deferred
+from rest_framework_api_key.models import APIKey
+from rest_framework_api_key.permissions import HasAPIKey
+
+from .dateutils import NOW, YESTERDAY
+
+pytestmark = pytest.mark.django_db
+
+
+@override_settings(API_KEY_DEFER_HASHER_UPGRADES=True)
+def test_deferred_hasher_upgrade(django_assert_num_queries: Callable) -> None:
+    key_generator = APIKey.objects.key_generator
+    api_key, key = APIKey.objects.create_key(name="test")
+    legacy_hashed_key = make_password(key)
+    APIKey.objects.filter(pk=api_key.pk).update(hashed_key=legacy_hashed_key)
+
+    # No writes during validation.
+    with django_assert_num_queries(2):
+        assert APIKey.objects.is_valid(key)
+        assert APIKey.objects.is_valid(key)
+
+    assert APIKey.objects.get(pk=api_key.pk).hashed_key == legacy_hashed_key
+
+    with django_assert_num_queries(1):
+        request_finished.send(sender=None)
+
+    hashed_key = APIKey.objects.get(pk=api_key.pk).hashed_key
+    assert key_generator.using_preferred_hasher(hashed_key)
+
+    # Nothing left to flush.
+    with django_assert_num_queries(0):
+        request_finished.send(sender=None)
+
+
+def test_flush_hasher_upgrades() -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    legacy_hashed_key = make_password(key)
+    APIKey.objects.filter(pk=api_key.pk).update(hashed_key=legacy_hashed_key)
+
+    new_hashed_key = APIKey.objects.key_generator.hash(key)
+    deferred.schedule_hasher_upgrade(
+        APIKey, api_key.pk, api_key.prefix, legacy_hashed_key, new_hashed_key
+    )
+    deferred.schedule_hasher_upgrade(
+        APIKey, "unknown", "unknown", legacy_hashed_key, new_hashed_key
+    )
+
+    assert deferred.flush_hasher_upgrades() == 1
+    assert deferred.flush_hasher_upgrades() == 0
+    assert APIKey.objects.get(pk=api_key.pk).hashed_key == new_hashed_key
+
+
+@api_view()
+@permission_classes([HasAPIKey])
+def view(request: Request) -> Response:
+    return Response()
+
+
+@override_settings(API_KEY_LAST_USED_INTERVAL=60)
+def test_last_used(rf: RequestFactory, django_assert_num_queries: Callable) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    _, other_key = APIKey.objects.create_key(name="test")
+    assert api_key.last_used is None
+
+    # Validation, and one `UPDATE` when the request finishes.
+    with django_assert_num_queries(2):
+        response = view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+        request_finished.send(sender=None)
+
+    assert response.status_code == 200
+    api_key.refresh_from_db()
+    assert api_key.last_used is not None
+    last_used = api_key.last_used
+
+    # Coalesced with the previous update.
+    with django_assert_num_queries(1):
+        view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+        request_finished.send(sender=None)
+
+    assert APIKey.objects.get(pk=api_key.pk).last_used == last_used
+
+    # Invalid keys are not tracked.
+    view(rf.get("/test/", HTTP_AUTHORIZATION="Api-Key abcd.efgh"))
+    assert deferred.flush_last_used() == 0
+
+    assert APIKey.objects.is_valid(other_key)
+    assert deferred.flush_last_used() == 0
+
+
+def test_last_used_disabled() -> None:
+    api_key, _ = APIKey.objects.create_key(name="test")
+
+    deferred.record_usage(APIKey, api_key.pk)
+
+    assert deferred.flush_last_used() == 0
+    assert APIKey.objects.get(pk=api_key.pk).last_used is None
+
+
+@override_settings(API_KEY_LAST_USED_INTERVAL=0)
+def test_flush_last_used() -> None:
+    hero = Hero.objects.create()
+    api_key, _ = APIKey.objects.create_key(name="test")
+    other_api_key, _ = APIKey.objects.create_key(name="test")
+    hero_api_key, _ = HeroAPIKey.objects.create_key(name="test", hero=hero)
+
+    deferred.record_usage(APIKey, api_key.pk)
+    deferred.record_usage(APIKey, other_api_key.pk)
+    deferred.record_usage(HeroAPIKey, hero_api_key.pk)
+    assert deferred.flush_last_used() == 3
+
+    # Not coalesced.
+    deferred.record_usage(APIKey, api_key.pk)
+    assert deferred.flush_last_used() == 1
+
+    for api_key in [api_key, other_api_key, hero_api_key]:
+        api_key.refresh_from_db()
+        assert api_key.last_used is not None
+
+
+@override_settings(API_KEY_LAST_USED_INTERVAL=0)
+def test_flush_last_used_keeps_each_time(
+    monkeypatch: pytest.MonkeyPatch, django_assert_num_queries: Callable
+) -> None:
+    api_key, _ = APIKey.objects.create_key(name="test")
+    other_api_key, _ = APIKey.objects.create_key(name="test")
+
+    monkeypatch.setattr(timezone, "now", lambda: YESTERDAY)
+    deferred.record_usage(APIKey, api_key.pk)
+    monkeypatch.setattr(timezone, "now", lambda: NOW)
+    deferred.record_usage(APIKey, other_api_key.pk)
+
+    with django_assert_num_queries(1):
+        assert deferred.flush_last_used() == 2
+
+    assert APIKey.objects.get(pk=api_key.pk).last_used == YESTERDAY
+    assert APIKey.objects.get(pk=other_api_key.pk).last_used == NOW
+
+
+@override_settings(API_KEY_LAST_USED_INTERVAL=0)
+def test_flush_closes_connections_it_opens() -> None:
+    api_key, _ = APIKey.objects.create_key(name="test")
+    closed_connection = mock.Mock(connection=None)
+    connections = [connection, closed_connection]
+
+    deferred.record_usage(APIKey, api_key.pk)
+
+    with mock.patch.object(deferred.connections, "all", return_value=connections):
+        with mock.patch.object(connection, "close") as close:
+            deferred.flush()
+
+    # Connections which were open are left as Django left them.
+    close.assert_not_called()
+    closed_connection.close.assert_called_once_with()
+    assert APIKey.objects.get(pk=api_key.pk).last_used is not None
+
+
+@override_settings(API_KEY_LAST_USED_INTERVAL=0)
+def test_flush_errors_are_logged(caplog: pytest.LogCaptureFixture) -> None:
+    api_key, _ = APIKey.objects.create_key(name="test")
+    deferred.record_usage(APIKey, api_key.pk)
+
+    with mock.patch.object(deferred, "flush_last_used", side_effect=DatabaseError):
+        request_finished.send(sender=None)
+
+    assert "Failed to flush deferred writes" in caplog.text
+    # Don't leave the pending update to other tests.
+    deferred.flush_last_used()
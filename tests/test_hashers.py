@@ -1,6 +1,24 @@
+from typing import Optional
+
 import pytest
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from django.utils.module_loading import import_string
+
+from rest_framework_api_key.crypto import (
+    BaseApiKeyHasher,
+    Blake2bApiKeyHasher,
+    BoundedExecutor,
+    HmacSha256ApiKeyHasher,
+    KeyGenerator,
+    Sha512ApiKeyHasher,
+    VerificationUnavailable,
+    get_password_executor,
+)
+from rest_framework_api_key.models import APIKey
 
-from rest_framework_api_key.crypto import Sha512ApiKeyHasher
+from .keyutils import wrong_key
 
 
 def test_sha512hasher_encode() -> None:
@@ -16,3 +34,138 @@ def test_sha512hasher_invalid_salt() -> None:
     hasher = Sha512ApiKeyHasher()
     with pytest.raises(ValueError):
         hasher.encode("test", "salt")
+
+
+@pytest.mark.parametrize(
+    "hasher", [Blake2bApiKeyHasher(), HmacSha256ApiKeyHasher()], ids=["blake2b", "hmac"]
+)
+@override_settings(API_KEY_HMAC_PEPPER="pepper")
+def test_fast_hashers_encode(hasher: BaseApiKeyHasher) -> None:
+    key = "test"
+    hashed_key = hasher.encode(key, hasher.salt())
+    assert hashed_key.startswith(f"{hasher.algorithm}$$")
+    assert hasher.verify(key, hashed_key)
+    assert not hasher.verify("not-test", hashed_key)
+
+
+def test_hmac_sha256_hasher_uses_pepper() -> None:
+    hasher = HmacSha256ApiKeyHasher()
+
+    with override_settings(API_KEY_HMAC_PEPPER="pepper"):
+        hashed_key = hasher.encode("test", "")
+
+    with override_settings(API_KEY_HMAC_PEPPER="other"):
+        assert not hasher.verify("test", hashed_key)
+
+
+@pytest.mark.parametrize("pepper", [None, ""])
+def test_hmac_sha256_hasher_requires_pepper(pepper: Optional[str]) -> None:
+    hasher = HmacSha256ApiKeyHasher()
+
+    with override_settings(API_KEY_HMAC_PEPPER=pepper):
+        with pytest.raises(ImproperlyConfigured):
+            hasher.encode("test", "")
+
+
+def test_base_hasher_digest_must_be_implemented() -> None:
+    with pytest.raises(NotImplementedError):
+        BaseApiKeyHasher().digest("test")
+
+
+@pytest.mark.django_db
+@override_settings(API_KEY_HMAC_PEPPER="pepper")
+@pytest.mark.parametrize(
+    "path",
+    [
+        "rest_framework_api_key.crypto.Blake2bApiKeyHasher",
+        "rest_framework_api_key.crypto.HmacSha256ApiKeyHasher",
+    ],
+)
+def test_preferred_hasher_setting_upgrades_keys(path: str) -> None:
+    key_generator = APIKey.objects.key_generator
+    api_key, key = APIKey.objects.create_key(name="test")
+    assert api_key.hashed_key.startswith("sha512$$")
+
+    with override_settings(API_KEY_HASHER=path):
+        hasher = key_generator.preferred_hasher
+        assert isinstance(hasher, import_string(path))
+        assert not key_generator.using_preferred_hasher(api_key.hashed_key)
+
+        assert APIKey.objects.is_valid(key)
+        assert not APIKey.objects.is_valid(wrong_key(key))
+
+        api_key.refresh_from_db()
+        assert api_key.hashed_key.startswith(f"{hasher.algorithm}$$")
+        assert APIKey.objects.is_valid(key)
+
+    assert key_generator.preferred_hasher.algorithm == "sha512"
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "django.contrib.auth.hashers.MD5PasswordHasher",
+        "rest_framework_api_key.crypto.concatenate",
+    ],
+)
+def test_preferred_hasher_must_be_api_key_hasher(path: str) -> None:
+    with override_settings(API_KEY_HASHER=path):
+        with pytest.raises(ImproperlyConfigured):
+            KeyGenerator().preferred_hasher
+
+
+def test_key_generator_verify_unknown_hasher() -> None:
+    key_generator = KeyGenerator()
+    assert not key_generator.verify("test", "")
+    assert not key_generator.verify("test", "unknown$$test")
+
+
+def test_key_generator_verify_password_hashers() -> None:
+    key_generator = KeyGenerator()
+    hashed_key = make_password("test", hasher="pbkdf2_sha1")
+    assert key_generator.verify("test", hashed_key)
+    assert not key_generator.verify("not-test", hashed_key)
+
+    with override_settings(
+        PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher"]
+    ):
+        assert not key_generator.verify("test", hashed_key)
+
+
+def test_bounded_executor() -> None:
+    executor = BoundedExecutor(max_workers=1, timeout=0.01)
+    assert executor.run(lambda value: value * 2, 21) == 42
+
+    # No free worker.
+    assert executor._semaphore.acquire()
+    with pytest.raises(VerificationUnavailable):
+        executor.run(lambda: None)
+    executor._semaphore.release()
+
+
+@override_settings(API_KEY_PASSWORD_HASHER_CONCURRENCY=1)
+def test_key_generator_verify_password_hashers_bounded() -> None:
+    key_generator = KeyGenerator()
+    hashed_key = make_password("test", hasher="pbkdf2_sha1")
+    executor = get_password_executor()
+    assert executor is not None
+
+    assert key_generator.verify("test", hashed_key)
+
+    with override_settings(API_KEY_PASSWORD_HASHER_TIMEOUT=0.01):
+        executor = get_password_executor()
+        assert executor is not None
+        assert executor._semaphore.acquire()
+        try:
+            # Keys hashed with API key hashers are not limited.
+            assert key_generator.verify("test", key_generator.hash("test"))
+            assert key_generator.verify(
+                "test", Blake2bApiKeyHasher().encode("test", "")
+            )
+
+            with pytest.raises(VerificationUnavailable):
+                key_generator.verify("test", hashed_key)
+        finally:
+            executor._semaphore.release()
+
+    assert get_password_executor() is not executor
@@ -0,0 +1,124 @@
+import pytest
+from django.contrib.auth.hashers import make_password
+from django.test import RequestFactory, override_settings
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from rest_framework_api_key.metrics import InMemoryMetrics, MetricsAdapter
+from rest_framework_api_key.models import APIKey
+from rest_framework_api_key.permissions import HasAPIKey
+from rest_framework_api_key.signals import api_key_event
+
+pytestmark = pytest.mark.django_db
+
+UNKNOWN_KEY = "abcdefgh." + "x" * 32
+
+
+@api_view()
+@permission_classes([HasAPIKey])
+def view(request: Request) -> Response:
+    return Response()
+
+
+def test_permission_events(rf: RequestFactory) -> None:
+    _, key = APIKey.objects.create_key(name="test")
+
+    with InMemoryMetrics() as metrics:
+        view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+        view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {UNKNOWN_KEY}"))
+        view(rf.get("/test/"))
+
+    assert metrics.get_count(event="parse", outcome="found") == 2
+    assert metrics.get_count(event="parse", outcome="not_found") == 1
+    assert metrics.get_count(event="lookup", outcome="found") == 1
+    assert metrics.get_count(event="lookup", outcome="not_found") == 1
+    assert metrics.get_count(event="verify", outcome="valid") == 1
+    assert metrics.get_count(event="validate", outcome="valid") == 1
+    assert metrics.get_count(event="validate", outcome="invalid") == 1
+    assert metrics.get_count(event="cache") == 0
+    assert metrics.get_count(model="rest_framework_api_key.APIKey") == 8
+
+    durations = metrics.get_durations(event="validate")
+    assert len(durations) == 2
+    assert all(duration >= 0 for duration in durations)
+
+    # Disconnected.
+    view(rf.get("/test/"))
+    assert metrics.get_count(event="parse") == 3
+
+
+@override_settings(API_KEY_CACHE_SIZE=10, API_KEY_CACHE_NEGATIVE_TTL=60)
+def test_cache_events() -> None:
+    _, key = APIKey.objects.create_key(name="test")
+
+    with InMemoryMetrics() as metrics:
+        assert APIKey.objects.is_valid(key)
+        assert APIKey.objects.is_valid(key)
+        assert not APIKey.objects.is_valid(UNKNOWN_KEY)
+        assert not APIKey.objects.is_valid(UNKNOWN_KEY)
+
+    assert metrics.get_count(event="cache", outcome="miss") == 2
+    assert metrics.get_count(event="cache", outcome="hit") == 1
+    assert metrics.get_count(event="cache", outcome="negative_hit") == 1
+    assert metrics.get_count(event="lookup") == 2
+
+
+@pytest.mark.parametrize("deferred, outcome", [(False, "upgraded"), (True, "deferred")])
+def test_upgrade_events(deferred: bool, outcome: str) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    APIKey.objects.filter(pk=api_key.pk).update(hashed_key=make_password(key))
+
+    with override_settings(API_KEY_DEFER_HASHER_UPGRADES=deferred):
+        with InMemoryMetrics() as metrics:
+            assert APIKey.objects.is_valid(key)
+
+    assert metrics.get_count(event="upgrade", outcome=outcome) == 1
+
+
+def test_upgrade_conflict_event() -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    api_key.hashed_key = make_password(key)
+
+    with InMemoryMetrics() as metrics:
+        assert api_key.is_valid(key)
+
+    assert metrics.get_count(event="upgrade", outcome="conflict") == 1
+
+
+def test_metrics_adapter() -> None:
+    recorded = []
+
+    class RecordingMetrics(MetricsAdapter):
+        def increment(self, name: str, labels: dict) -> None:
+            recorded.append((name, labels))
+
+        def observe(self, name: str, value: float, labels: dict) -> None:
+            recorded.append((name, labels))
+
+    metrics = RecordingMetrics()
+    metrics.connect()
+    try:
+        api_key_event.send(sender=APIKey, event="parse", outcome="found", duration=1)
+    finally:
+        metrics.disconnect()
+
+    labels = {
+        "model": "rest_framework_api_key.APIKey",
+        "event": "parse",
+        "outcome": "found",
+    }
+    assert recorded == [
+        ("api_key_events_total", labels),
+        ("api_key_event_duration_seconds", labels),
+    ]
+
+
+def test_metrics_adapter_methods_must_be_implemented() -> None:
+    metrics = MetricsAdapter()
+
+    with pytest.raises(NotImplementedError):
+        metrics.increment("name", {})
+
+    with pytest.raises(NotImplementedError):
+        metrics.observe("name", 1, {})
@@ -73,3 +73,60 @@ def test_migrations_0004_prefix_hashed_key(migrator: Migrator) -> None:
     api_key = APIKey.objects.get(id=api_key.id)
     assert api_key.prefix == prefix
     assert api_key.hashed_key == hashed_key
+
+
+@pytest.mark.django_db
+def test_migrations_copy_api_keys_to_compact_model(migrator: Migrator) -> None:
+    import datetime as dt
+
+    from django.utils import timezone
+
+    from rest_framework_api_key.crypto import KeyGenerator
+
+    old_state = migrator.apply_initial_migration(
+        ("heroes", "0005_heroapikey_heroes_hero_prefix_4c0855_idx")
+    )
+    Hero = old_state.apps.get_model("heroes", "Hero")
+    HeroAPIKey = old_state.apps.get_model("heroes", "HeroAPIKey")
+
+    hero = Hero.objects.create(name="test")
+    key, prefix, hashed_key = KeyGenerator().generate()
+    created = timezone.now() - dt.timedelta(days=30)
+    HeroAPIKey.objects.create(
+        id=prefix + "." + hashed_key,
+        prefix=prefix,
+        hashed_key=hashed_key,
+        name="test",
+        hero=hero,
+    )
+    HeroAPIKey.objects.update(created=created)
+
+    new_state = migrator.apply_tested_migration(("heroes", "0006_compactheroapikey"))
+    CompactHeroAPIKey = new_state.apps.get_model("heroes", "CompactHeroAPIKey")
+
+    api_key = CompactHeroAPIKey.objects.get()
+    assert api_key.prefix == prefix
+    assert api_key.hashed_key == hashed_key
+    assert api_key.name == "test"
+    assert api_key.hero_id == hero.pk
+    assert api_key.created == created
+    assert KeyGenerator().verify(key, api_key.hashed_key)
+
+
+def test_copy_api_keys_serialization() -> None:
+    from django.db.migrations.writer import MigrationWriter
+
+    from rest_framework_api_key.operations import CopyAPIKeys
+
+    operation = CopyAPIKeys("heroes.HeroAPIKey", "heroes.CompactHeroAPIKey", 500)
+    string, imports = MigrationWriter.serialize(operation)
+
+    namespace: dict = {}
+    exec("\n".join(imports), namespace)
+    deserialized = eval(string, namespace)
+
+    assert isinstance(deserialized, CopyAPIKeys)
+    assert deserialized.deconstruct() == operation.deconstruct()
+    assert deserialized.from_model == "heroes.HeroAPIKey"
+    assert deserialized.to_model == "heroes.CompactHeroAPIKey"
+    assert deserialized.batch_size == 500
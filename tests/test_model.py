@@ -1,10 +1,13 @@
 import datetime as dt
 import string
+from typing import Callable
+from unittest import mock
 
 import pytest
 from django.contrib.auth.hashers import make_password
 from django.core.exceptions import ValidationError
 from django.db.utils import IntegrityError
+from django.test import override_settings
 from test_project.heroes.models import Hero, HeroAPIKey
 
 from rest_framework_api_key.models import APIKey
@@ -89,6 +92,37 @@ def test_api_key_hash_upgrade() -> None:
     assert key_generator.using_preferred_hasher(api_key.hashed_key)
 
 
+def test_api_key_hash_upgrade_is_compare_and_swap(
+    django_assert_num_queries: Callable,
+) -> None:
+    key_generator = APIKey.objects.key_generator
+    api_key, generated_key = APIKey.objects.create_key(name="test")
+    api_key.hashed_key = make_password(generated_key)
+    api_key.save()
+
+    # Only the hashed key is updated, in a single query.
+    with django_assert_num_queries(1) as context:
+        assert api_key.is_valid(generated_key)
+    assert 'SET "hashed_key"' in context.captured_queries[0]["sql"]
+
+    api_key.refresh_from_db()
+    assert key_generator.using_preferred_hasher(api_key.hashed_key)
+
+
+def test_api_key_hash_upgrade_concurrent_change() -> None:
+    api_key, generated_key = APIKey.objects.create_key(name="test")
+    legacy_hashed_key = make_password(generated_key)
+    api_key.hashed_key = legacy_hashed_key
+    api_key.save()
+
+    # The hashed key changes after the API key was loaded.
+    APIKey.objects.filter(pk=api_key.pk).update(hashed_key="changed")
+
+    assert api_key.is_valid(generated_key)
+    api_key.refresh_from_db()
+    assert api_key.hashed_key == "changed"
+
+
 @pytest.mark.django_db
 def test_api_key_manager_get_from_key() -> None:
     api_key, generated_key = APIKey.objects.create_key(name="test")
@@ -115,3 +149,266 @@ def test_api_key_str() -> None:
     _, generated_key = APIKey.objects.create_key(name="test")
     retrieved_key = APIKey.objects.get_from_key(generated_key)
     assert str(retrieved_key) == "test"
+
+
+@pytest.mark.parametrize(
+    "expiry_date, revoked, valid",
+    [
+        (None, False, True),
+        (TOMORROW, False, True),
+        (YESTERDAY, False, False),
+        (None, True, False),
+    ],
+)
+def test_api_key_manager_is_valid(
+    expiry_date: dt.datetime, revoked: bool, valid: bool
+) -> None:
+    _, generated_key = APIKey.objects.create_key(
+        name="test", expiry_date=expiry_date, revoked=revoked
+    )
+    assert APIKey.objects.is_valid(generated_key) is valid
+    assert APIKey.objects.is_valid("foobar") is False
+
+
+def test_api_key_manager_get_valid_key_loads_validation_fields_only(
+    django_assert_num_queries: Callable,
+) -> None:
+    api_key, generated_key = APIKey.objects.create_key(name="test")
+
+    with django_assert_num_queries(1):
+        valid_key = APIKey.objects.get_valid_key(generated_key)
+
+    assert valid_key == api_key
+    assert valid_key is not None
+    assert valid_key.get_deferred_fields() == {"name", "created", "last_used"}
+
+    assert APIKey.objects.get_valid_key(f"{api_key.prefix}.{'x' * 32}") is None
+    assert APIKey.objects.get_valid_key("foobar") is None
+
+
+@pytest.mark.parametrize("expiry_date", [NOW, YESTERDAY])
+def test_api_key_manager_get_valid_key_expired(expiry_date: dt.datetime) -> None:
+    _, generated_key = APIKey.objects.create_key(name="test", expiry_date=expiry_date)
+    assert APIKey.objects.get_valid_key(generated_key) is None
+
+
+def test_api_key_manager_validate_many(django_assert_num_queries: Callable) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    other_api_key, other_key = APIKey.objects.create_key(name="test")
+    _, revoked_key = APIKey.objects.create_key(name="test", revoked=True)
+    _, expired_key = APIKey.objects.create_key(name="test", expiry_date=YESTERDAY)
+    keys = [
+        key,
+        other_key,
+        key,
+        revoked_key,
+        expired_key,
+        f"{api_key.prefix}.{'x' * 32}",
+        "foobar",
+    ]
+
+    with django_assert_num_queries(1):
+        result = APIKey.objects.validate_many(keys)
+
+    assert result == {
+        key: api_key,
+        other_key: other_api_key,
+        revoked_key: None,
+        expired_key: None,
+        f"{api_key.prefix}.{'x' * 32}": None,
+        "foobar": None,
+    }
+    valid_key = result[key]
+    assert valid_key is not None
+    assert valid_key.get_deferred_fields() == {"name", "created", "last_used"}
+
+
+def test_api_key_manager_validate_many_batches(
+    django_assert_num_queries: Callable,
+) -> None:
+    created = list(APIKey.objects.bulk_create_keys(5, name="test"))
+
+    with django_assert_num_queries(3):
+        result = APIKey.objects.validate_many([key for _, key in created], batch_size=2)
+
+    assert result == {key: api_key for api_key, key in created}
+    assert APIKey.objects.validate_many([]) == {}
+
+
+def test_api_key_manager_validate_many_hash_upgrade() -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    APIKey.objects.filter(pk=api_key.pk).update(hashed_key=make_password(key))
+
+    assert APIKey.objects.validate_many([key]) == {key: api_key}
+
+    api_key.refresh_from_db()
+    assert api_key.hashed_key.startswith("sha512$$")
+
+
+def test_api_key_manager_validation_select_related(
+    django_assert_num_queries: Callable,
+) -> None:
+    hero = Hero.objects.create(name="Batman")
+    api_key, key = HeroAPIKey.objects.create_key(name="test", hero=hero)
+
+    with django_assert_num_queries(1):
+        assert HeroAPIKey.objects.get_from_key(key).hero.name == "Batman"
+
+    with django_assert_num_queries(1):
+        valid_key = HeroAPIKey.objects.get_valid_key(key)
+        assert valid_key is not None
+        assert valid_key.hero.name == "Batman"
+
+    assert valid_key.get_deferred_fields() == {"name", "created", "last_used"}
+
+    with django_assert_num_queries(1):
+        result = HeroAPIKey.objects.validate_many([key])
+        assert result[key] == api_key
+        assert result[key].hero.name == "Batman"  # type: ignore
+
+
+@override_settings(API_KEY_CACHE_SIZE=16)
+def test_get_from_key_select_related(django_assert_num_queries: Callable) -> None:
+    hero = Hero.objects.create(name="Batman")
+    _, key = HeroAPIKey.objects.create_key(name="test", hero=hero)
+    manager = HeroAPIKey.objects
+
+    with mock.patch.object(manager, "validation_select_related", ()):
+        # Cached API keys do not include related objects, so the cache is bypassed.
+        manager.get_from_key(key)
+
+        with django_assert_num_queries(1):
+            assert manager.get_from_key(key, select_related=["hero"]).hero == hero
+
+        with django_assert_num_queries(0):
+            with pytest.raises(HeroAPIKey.DoesNotExist):
+                manager.get_from_key("abcd.efgh", select_related=["hero"])
+
+
+@pytest.mark.parametrize(
+    "key",
+    ["", "foobar", "abcd.efgh", "abcdefgh" + "x" * 33, "abcdefgh." + "x" * 31],
+)
+def test_api_key_manager_rejects_malformed_keys(
+    key: str, django_assert_num_queries: Callable
+) -> None:
+    assert not APIKey.objects.key_generator.is_well_formed(key)
+
+    with django_assert_num_queries(0):
+        assert APIKey.objects.get_valid_key(key) is None
+        assert APIKey.objects.validate_many([key]) == {key: None}
+        with pytest.raises(APIKey.DoesNotExist):
+            APIKey.objects.get_from_key(key)
+
+
+def test_api_key_manager_custom_key_generator_without_format_check(
+    django_assert_num_queries: Callable,
+) -> None:
+    class CustomKeyGenerator:
+        pass
+
+    with mock.patch.object(APIKey.objects, "key_generator", CustomKeyGenerator()):
+        with django_assert_num_queries(1):
+            assert APIKey.objects.get_valid_key("abcd.efgh") is None
+
+
+def test_api_key_manager_get_usable_keys() -> None:
+    usable_keys = {
+        APIKey.objects.create_key(name="test")[0],
+        APIKey.objects.create_key(name="test", expiry_date=TOMORROW)[0],
+    }
+    APIKey.objects.create_key(name="test", expiry_date=YESTERDAY)
+    APIKey.objects.create_key(name="test", revoked=True)
+
+    assert set(APIKey.objects.get_usable_keys()) == usable_keys
+
+
+def test_api_key_manager_get_from_key_expired_key() -> None:
+    _, generated_key = APIKey.objects.create_key(name="test", expiry_date=YESTERDAY)
+    with pytest.raises(APIKey.DoesNotExist):
+        APIKey.objects.get_from_key(generated_key)
+
+
+def test_api_key_manager_bulk_create_keys(django_assert_num_queries: Callable) -> None:
+    created = APIKey.objects.bulk_create_keys(5, batch_size=2, name="test")
+
+    # API keys are created lazily.
+    assert APIKey.objects.count() == 0
+
+    # One query to check for prefix collisions, and one to insert each batch.
+    with django_assert_num_queries(6):
+        results = list(created)
+
+    assert len(results) == 5
+    assert APIKey.objects.count() == 5
+    for api_key, generated_key in results:
+        assert APIKey.objects.get_from_key(generated_key) == api_key
+
+
+def test_api_key_manager_bulk_create_keys_kwargs() -> None:
+    hero = Hero.objects.create()
+    results = list(
+        HeroAPIKey.objects.bulk_create_keys(
+            [{"name": "a", "hero": hero}, {"name": "b", "hero": hero, "id": "x"}]
+        )
+    )
+
+    assert [api_key.name for api_key, _ in results] == ["a", "b"]
+    for api_key, generated_key in results:
+        assert api_key.hero == hero
+        assert HeroAPIKey.objects.is_valid(generated_key)
+
+
+def test_api_key_manager_bulk_create_keys_prefix_collisions(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    existing_key, _ = APIKey.objects.create_key(name="test")
+    key_generator = APIKey.objects.key_generator
+    prefixes = iter(
+        [existing_key.prefix, "aaaaaaaa", "aaaaaaaa", "bbbbbbbb", "cccccccc"]
+    )
+    monkeypatch.setattr(key_generator, "get_prefix", lambda: next(prefixes))
+
+    results = list(APIKey.objects.bulk_create_keys([{"name": "a"}, {"name": "b"}]))
+
+    assert sorted(api_key.prefix for api_key, _ in results) == ["aaaaaaaa", "bbbbbbbb"]
+    for api_key, generated_key in results:
+        assert APIKey.objects.get_from_key(generated_key) == api_key
+
+
+def test_api_key_queryset_revoke(django_assert_num_queries: Callable) -> None:
+    hero, other_hero = Hero.objects.create(), Hero.objects.create()
+    _, key = HeroAPIKey.objects.create_key(name="test", hero=hero)
+    HeroAPIKey.objects.create_key(name="test", hero=hero, revoked=True)
+    _, other_key = HeroAPIKey.objects.create_key(name="test", hero=other_hero)
+
+    with django_assert_num_queries(1):
+        assert HeroAPIKey.objects.filter(hero=hero).revoke() == 1
+
+    assert not HeroAPIKey.objects.is_valid(key)
+    assert HeroAPIKey.objects.is_valid(other_key)
+
+    assert HeroAPIKey.objects.all().revoke() == 1
+    assert not HeroAPIKey.objects.is_valid(other_key)
+    assert HeroAPIKey.objects.all().revoke() == 0
+
+
+def test_api_key_manager_has_no_bulk_updates() -> None:
+    # Updating all API keys at once must be explicit.
+    assert not hasattr(APIKey.objects, "revoke")
+    assert not hasattr(APIKey.objects, "set_expiry")
+
+
+def test_api_key_queryset_set_expiry(django_assert_num_queries: Callable) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    revoked_key, _ = APIKey.objects.create_key(name="test", revoked=True)
+
+    with django_assert_num_queries(1):
+        assert APIKey.objects.all().set_expiry(YESTERDAY) == 1
+
+    assert not APIKey.objects.is_valid(key)
+    revoked_key.refresh_from_db()
+    assert revoked_key.expiry_date is None
+
+    assert APIKey.objects.filter(pk=api_key.pk).set_expiry(None) == 1
+    assert APIKey.objects.is_valid(key)
@@ -2,11 +2,14 @@ import datetime as dt
 from typing import Callable
 
 import pytest
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ImproperlyConfigured
 from django.test import RequestFactory, override_settings
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from rest_framework_api_key.crypto import get_password_executor
 from rest_framework_api_key.models import APIKey
 from rest_framework_api_key.permissions import BaseHasAPIKey, HasAPIKey, KeyParser
 
@@ -128,6 +131,54 @@ def test_expiry_date(rf: RequestFactory, expiry_date: dt.datetime, ok: bool) ->
     assert response.status_code == status_code
 
 
+@override_settings(
+    API_KEY_SOURCES=[
+        "header:HTTP_X_API_KEY",
+        "authorization",
+        "query:api_key",
+        "cookie:api_key",
+    ]
+)
+def test_keyparser_sources(rf: RequestFactory) -> None:
+    parser = KeyParser()
+
+    request = rf.get("/test/?api_key=query")
+    request.COOKIES["api_key"] = "cookie"
+    assert parser.get(request) == "query"
+
+    request = rf.get("/test/", HTTP_AUTHORIZATION="Api-Key authorization")
+    request.COOKIES["api_key"] = "cookie"
+    assert parser.get(request) == "authorization"
+
+    request = rf.get("/test/", HTTP_X_API_KEY="header", HTTP_AUTHORIZATION="Api-Key x")
+    assert parser.get(request) == "header"
+
+    request = rf.get("/test/")
+    request.COOKIES["api_key"] = "cookie"
+    assert parser.get(request) == "cookie"
+
+    assert parser.get(rf.get("/test/?api_key=")) is None
+
+
+def test_keyparser_query_param_source(rf: RequestFactory) -> None:
+    _, key = APIKey.objects.create_key(name="test")
+    request = rf.get(f"/test/?api_key={key}")
+
+    assert view(request).status_code == 403
+
+    with override_settings(API_KEY_SOURCES=["query:api_key"]):
+        assert view(request).status_code == 200
+
+
+@pytest.mark.parametrize(
+    "source", ["header", "authorization:HTTP_AUTHORIZATION", "body:api_key", ""]
+)
+def test_keyparser_invalid_source(rf: RequestFactory, source: str) -> None:
+    with override_settings(API_KEY_SOURCES=[source]):
+        with pytest.raises(ImproperlyConfigured):
+            KeyParser().get(rf.get("/test/"))
+
+
 def test_keyparser_keyword_override(rf: RequestFactory) -> None:
     class BearerKeyParser(KeyParser):
         keyword = "Bearer"
@@ -153,3 +204,57 @@ def test_keyparser_lookup_exact_keyword(rf: RequestFactory) -> None:
     wrong_key = "My-Special-Api-Key 12345"
     request = rf.get("/test/", HTTP_AUTHORIZATION=wrong_key)
     assert KeyParser().get(request) is None
+
+
+def test_validation_is_memoized_per_request(
+    rf: RequestFactory, django_assert_num_queries: Callable
+) -> None:
+    @api_view()
+    @permission_classes([HasAPIKey, HasAPIKey | HasAPIKey])
+    def view(request: Request) -> Response:
+        return Response()
+
+    _, key = APIKey.objects.create_key(name="test")
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+
+    with django_assert_num_queries(1):
+        response = view(request)
+    assert response.status_code == 200
+
+
+def test_invalid_key_validation_is_memoized_per_request(
+    rf: RequestFactory, django_assert_num_queries: Callable
+) -> None:
+    @api_view()
+    @permission_classes([HasAPIKey | HasAPIKey])
+    def view(request: Request) -> Response:
+        return Response()
+
+    key = "abcdefgh." + "x" * 32
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+
+    with django_assert_num_queries(1):
+        response = view(request)
+    assert response.status_code == 403
+
+
+def test_if_verification_unavailable_then_service_unavailable(
+    rf: RequestFactory,
+) -> None:
+    api_key, key = APIKey.objects.create_key(name="test")
+    APIKey.objects.filter(pk=api_key.pk).update(hashed_key=make_password(key))
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+
+    with override_settings(
+        API_KEY_PASSWORD_HASHER_CONCURRENCY=1, API_KEY_PASSWORD_HASHER_TIMEOUT=0
+    ):
+        executor = get_password_executor()
+        assert executor is not None
+        assert executor._semaphore.acquire()
+        try:
+            response = view(request)
+        finally:
+            executor._semaphore.release()
+
+    assert response.status_code == 503
+    assert response.data["detail"].code == "api_key_verification_unavailable"
@@ -0,0 +1,54 @@
+import datetime as dt
+import io
+
+import pytest
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.utils import timezone
+from test_project.heroes.models import Hero, HeroAPIKey
+
+from rest_framework_api_key.models import APIKey
+
+pytestmark = pytest.mark.django_db
+
+
+def _report(*args: str) -> str:
+    stdout = io.StringIO()
+    call_command("report_api_key_hashers", *args, stdout=stdout)
+    return stdout.getvalue()
+
+
+def test_report_api_key_hashers() -> None:
+    for _ in range(3):
+        APIKey.objects.create_key(name="test")
+
+    api_key, key = APIKey.objects.create_key(name="legacy")
+    APIKey.objects.filter(pk=api_key.pk).update(hashed_key=make_password(key))
+
+    api_key, _ = APIKey.objects.create_key(name="unknown")
+    APIKey.objects.filter(pk=api_key.pk).update(hashed_key="unknown")
+
+    api_key, key = APIKey.objects.create_key(
+        name="expired", expiry_date=timezone.now() - dt.timedelta(days=1)
+    )
+    APIKey.objects.filter(pk=api_key.pk).update(hashed_key=make_password(key))
+
+    hero = Hero.objects.create()
+    HeroAPIKey.objects.create_key(name="test", hero=hero)
+
+    output = _report("--batch-size", "2")
+    assert (
+        "rest_framework_api_key.APIKey: 2 of 5 API keys use an outdated hasher.\n"
+        "  sha512: 3\n"
+        "  pbkdf2_sha256: 1\n"
+        "  unknown: 1\n"
+    ) in output
+    assert "heroes.HeroAPIKey: 0 of 1 API keys use an outdated hasher." in output
+
+    output = _report("--model", "rest_framework_api_key.APIKey", "--include-unusable")
+    assert output == (
+        "rest_framework_api_key.APIKey: 3 of 6 API keys use an outdated hasher.\n"
+        "  sha512: 3\n"
+        "  pbkdf2_sha256: 2\n"
+        "  unknown: 1\n"
+    )
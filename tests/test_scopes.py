@@ -0,0 +1,122 @@
+from typing import Any, Callable
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from test_project.heroes.models import Hero, HeroAPIKey
+
+from rest_framework_api_key.models import APIKey
+from rest_framework_api_key.permissions import (
+    BaseHasAPIKeyWithScopes,
+    HasAPIKeyWithScopes,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+class HeroView(APIView):
+    permission_classes = [HasAPIKeyWithScopes]
+    required_scopes: Any = {"GET": ["heroes:read"], "*": ["heroes:write"]}
+
+    def get(self, request: Request) -> Response:
+        return Response()
+
+    def post(self, request: Request) -> Response:
+        return Response()
+
+
+view = HeroView.as_view()
+
+
+@pytest.mark.parametrize(
+    "scopes, method, status_code",
+    [
+        ("heroes:read", "get", 200),
+        ("heroes:read", "post", 403),
+        ("heroes:read heroes:write", "post", 200),
+        ("heroes:write", "get", 403),
+        ("", "get", 403),
+    ],
+)
+def test_required_scopes_by_method(
+    rf: RequestFactory, scopes: str, method: str, status_code: int
+) -> None:
+    _, key = APIKey.objects.create_key(name="test", scopes=scopes)
+    request = getattr(rf, method)("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+
+    response = view(request)
+
+    assert response.status_code == status_code
+
+
+@pytest.mark.parametrize(
+    "required_scopes, ok",
+    [
+        ((), True),
+        (["heroes:read"], True),
+        ("heroes:read heroes:write", False),
+        ({"GET": []}, True),
+        # Methods which are not listed are denied.
+        ({"POST": ["heroes:write"]}, False),
+        ({"POST": []}, False),
+    ],
+)
+def test_required_scopes(rf: RequestFactory, required_scopes: Any, ok: bool) -> None:
+    _, key = APIKey.objects.create_key(name="test", scopes="heroes:read")
+    view = HeroView.as_view(required_scopes=required_scopes)
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+
+    response = view(request)
+
+    assert response.status_code == (200 if ok else 403)
+
+
+def test_required_scopes_not_declared(rf: RequestFactory) -> None:
+    _, key = APIKey.objects.create_key(name="test", scopes="heroes:read")
+    view = HeroView.as_view(required_scopes=None)
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+
+    with pytest.raises(ImproperlyConfigured):
+        view(request)
+
+
+def test_invalid_key_denied(rf: RequestFactory) -> None:
+    response = view(rf.get("/test/", HTTP_AUTHORIZATION="Api-Key abcd.efgh"))
+    assert response.status_code == 403
+
+
+def test_scopes_loaded_with_key(
+    rf: RequestFactory, django_assert_num_queries: Callable
+) -> None:
+    _, key = APIKey.objects.create_key(name="test", scopes="heroes:read")
+
+    with django_assert_num_queries(1):
+        response = view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+
+    assert response.status_code == 200
+
+
+def test_custom_api_key_model(rf: RequestFactory) -> None:
+    class HasHeroAPIKeyWithScopes(BaseHasAPIKeyWithScopes):
+        model = HeroAPIKey
+
+    hero = Hero.objects.create()
+    _, key = HeroAPIKey.objects.create_key(name="test", hero=hero, scopes="heroes:read")
+    view = HeroView.as_view(permission_classes=[HasHeroAPIKeyWithScopes])
+
+    response = view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+    assert response.status_code == 200
+
+    response = view(rf.post("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+    assert response.status_code == 403
+
+
+def test_api_key_scopes() -> None:
+    api_key = APIKey(scopes=" heroes:read  heroes:write ")
+    assert api_key.get_scopes() == {"heroes:read", "heroes:write"}
+    assert api_key.has_scopes({"heroes:read"})
+    assert not api_key.has_scopes({"heroes:read", "admin"})
+    assert APIKey().get_scopes() == frozenset()
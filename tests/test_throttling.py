@@ -0,0 +1,171 @@
+from typing import Callable, Iterator
+from unittest import mock
+
+import pytest
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.test import RequestFactory
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.request import Request
+from rest_framework.response import Response
+from test_project.heroes.models import Hero, HeroAPIKey
+from test_project.heroes.permissions import HasHeroAPIKey
+
+from rest_framework_api_key.models import APIKey
+from rest_framework_api_key.permissions import HasAPIKey
+from rest_framework_api_key.rates import (
+    BaseRateStore,
+    CacheRateStore,
+    InMemoryRateStore,
+    parse_rate,
+)
+from rest_framework_api_key.throttling import (
+    APIKeyRateThrottle,
+    BaseAPIKeyRateThrottle,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_cache() -> Iterator[None]:
+    caches["default"].clear()
+    yield
+    caches["default"].clear()
+
+
+@api_view()
+@permission_classes([HasAPIKey])
+@throttle_classes([APIKeyRateThrottle])
+def view(request: Request) -> Response:
+    return Response()
+
+
+@pytest.mark.parametrize(
+    "rate, expected",
+    [
+        ("10/s", (10, 1)),
+        ("100/min", (100, 60)),
+        ("5/hour", (5, 3600)),
+        ("1/d", (1, 86400)),
+    ],
+)
+def test_parse_rate(rate: str, expected: tuple) -> None:
+    assert parse_rate(rate) == expected
+
+
+@pytest.mark.parametrize("rate", ["", "10", "10/", "ten/min", "-1/min", "10/week"])
+def test_invalid_rate(rate: str) -> None:
+    with pytest.raises(ValueError):
+        parse_rate(rate)
+
+    api_key = APIKey(name="test", rate_limit=rate or "x")
+    with pytest.raises(ValidationError):
+        api_key.full_clean(exclude=["id", "prefix", "hashed_key"])
+
+
+# Requests are counted in fixed windows: don't let them straddle two windows.
+@mock.patch("time.time", return_value=1005)
+def test_rate_limit(
+    time: mock.Mock, rf: RequestFactory, django_assert_num_queries: Callable
+) -> None:
+    _, key = APIKey.objects.create_key(name="test", rate_limit="2/min")
+    _, other_key = APIKey.objects.create_key(name="test")
+
+    # Throttling reuses the API key validated by the permission.
+    with django_assert_num_queries(1):
+        response = view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+    assert response.status_code == 200
+
+    response = view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+    assert response.status_code == 200
+
+    response = view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+    assert response.status_code == 429
+    assert response["Retry-After"] == "15"
+
+    for _ in range(3):
+        response = view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {other_key}"))
+        assert response.status_code == 200
+
+
+@mock.patch("time.time", return_value=1005)
+def test_quota(time: mock.Mock, rf: RequestFactory) -> None:
+    _, key = APIKey.objects.create_key(name="test", rate_limit="5/s", quota="1/day")
+
+    response = view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+    assert response.status_code == 200
+
+    response = view(rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+    assert response.status_code == 429
+
+
+def test_requests_without_valid_key_not_throttled(rf: RequestFactory) -> None:
+    throttle = APIKeyRateThrottle()
+    request = rf.get("/test/")
+    assert throttle.allow_request(request, None)
+
+    request = rf.get("/test/", HTTP_AUTHORIZATION="Api-Key abcd.efgh")
+    assert throttle.allow_request(request, None)
+    assert throttle.wait() is None
+
+
+def test_custom_api_key_model(rf: RequestFactory) -> None:
+    class HeroAPIKeyRateThrottle(BaseAPIKeyRateThrottle):
+        permission_class = HasHeroAPIKey
+        store = InMemoryRateStore()
+
+    hero = Hero.objects.create()
+    _, key = HeroAPIKey.objects.create_key(name="test", hero=hero, rate_limit="1/s")
+    throttle = HeroAPIKeyRateThrottle()
+
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+    assert throttle.allow_request(request, None)
+    request = rf.get("/test/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+    assert not throttle.allow_request(request, None)
+
+
+def test_in_memory_rate_store() -> None:
+    store = InMemoryRateStore()
+
+    with mock.patch("time.monotonic", return_value=100):
+        assert store.hit("key", 2, 10) is None
+    with mock.patch("time.monotonic", return_value=105):
+        assert store.hit("key", 2, 10) is None
+        assert store.hit("key", 2, 10) == 5
+        assert store.hit("other", 2, 10) is None
+
+    # The oldest request is out of the window.
+    with mock.patch("time.monotonic", return_value=110):
+        assert store.hit("key", 2, 10) is None
+        assert store.hit("key", 2, 10) == 5
+
+    store.clear()
+    with mock.patch("time.monotonic", return_value=110):
+        assert store.hit("key", 2, 10) is None
+
+
+def test_cache_rate_store() -> None:
+    store = CacheRateStore()
+
+    with mock.patch("time.time", return_value=1005):
+        assert store.hit("key", 2, 10) is None
+        assert store.hit("key", 2, 10) is None
+        assert store.hit("key", 2, 10) == 5
+
+    # Next window.
+    with mock.patch("time.time", return_value=1010):
+        assert store.hit("key", 2, 10) is None
+
+
+def test_cache_rate_store_entry_evicted() -> None:
+    store = CacheRateStore()
+    cache = caches["default"]
+
+    with mock.patch.object(cache, "incr", side_effect=ValueError):
+        assert store.hit("key", 1, 10) is None
+
+
+def test_base_rate_store() -> None:
+    with pytest.raises(NotImplementedError):
+        BaseRateStore().hit("key", 1, 10)
@@ -0,0 +1,265 @@
+"""
+Benchmarks for the API key authentication hot path.
+
+Usage:
+
+    python -m tools.benchmark [-n ITERATIONS] [-k SUBSTRING]
+
+Benchmarks run against an in-memory SQLite database by default. Set the
+`DATABASE_URL` environment variable to run them against another database,
+e.g. PostgreSQL.
+"""
+import argparse
+import functools
+import pathlib
+import statistics
+import sys
+import time
+import typing
+from datetime import timedelta
+
+import dj_database_url
+import django
+from django.conf import settings
+
+root = pathlib.Path(__file__).parent.parent
+sys.path.append(str(root))
+
+SETTINGS = {
+    "SECRET_KEY": "benchmark",
+    "INSTALLED_APPS": [
+        "django.contrib.contenttypes",
+        "django.contrib.auth",
+        "django.contrib.admin",
+        "django.contrib.messages",
+        "django.contrib.sessions",
+        "rest_framework",
+        "rest_framework_api_key",
+        "test_project.heroes",
+    ],
+    "MIDDLEWARE": [
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.contrib.messages.middleware.MessageMiddleware",
+        "django.contrib.auth.middleware.AuthenticationMiddleware",
+    ],
+    "ROOT_URLCONF": "test_project.project.urls",
+    "DATABASES": {"default": dj_database_url.config(default="sqlite://:memory:")},
+    "PASSWORD_HASHERS": [
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+        "django.contrib.auth.hashers.Argon2PasswordHasher",
+        "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+        "django.contrib.auth.hashers.ScryptPasswordHasher",
+    ],
+    "ALLOWED_HOSTS": ["testserver"],
+    "USE_TZ": True,
+    "API_KEY_HMAC_PEPPER": "benchmark",
+}
+
+
+class Result(typing.NamedTuple):
+    name: str
+    iterations: int
+    timings: typing.List[float]
+    queries: int
+
+    @property
+    def rps(self) -> float:
+        return len(self.timings) / sum(self.timings)
+
+    def percentile(self, p: int) -> float:
+        if len(self.timings) < 2:
+            return self.timings[0]
+        return statistics.quantiles(self.timings, n=100)[p - 1]
+
+
+def measure(
+    name: str, func: typing.Callable[[], typing.Any], iterations: int
+) -> Result:
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    func()  # Warm up.
+
+    timings = []
+
+    with CaptureQueriesContext(connection) as context:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+    return Result(name, iterations, timings, len(context.captured_queries))
+
+
+def get_benchmarks(
+    iterations: int,
+) -> typing.Iterator[typing.Tuple[str, typing.Callable[[], typing.Any], int]]:
+    from django.contrib.auth.hashers import get_hashers, make_password
+    from django.test import RequestFactory, override_settings
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+    from test_project.heroes.models import Hero, HeroAPIKey
+
+    from rest_framework_api_key.crypto import API_KEY_HASHERS
+    from rest_framework_api_key.models import APIKey
+    from rest_framework_api_key.permissions import KeyParser
+
+    key_generator = APIKey.objects.key_generator
+    hero = Hero.objects.create(name="Batman")
+
+    # Parsing.
+    key_parser = KeyParser()
+    _, key = APIKey.objects.create_key(name="parse")
+    request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Api-Key {key}")
+    yield "KeyParser.get", lambda: key_parser.get(request), iterations
+
+    # Hashing.
+    yield "KeyGenerator.hash", lambda: key_generator.hash(key), iterations
+
+    for api_key_hasher_class in API_KEY_HASHERS:
+        api_key_hasher = api_key_hasher_class()
+        yield (
+            f"KeyGenerator.verify [{api_key_hasher.algorithm}]",
+            functools.partial(
+                key_generator.verify, key, api_key_hasher.encode(key, "")
+            ),
+            iterations,
+        )
+
+    for hasher in get_hashers():
+        try:
+            legacy_hashed_key = make_password(key, hasher=hasher.algorithm)
+        except ValueError:  # Missing optional dependency, e.g. argon2.
+            continue
+        yield (
+            f"KeyGenerator.verify [{hasher.algorithm}]",
+            functools.partial(key_generator.verify, key, legacy_hashed_key),
+            max(1, iterations // 100),  # Deliberately slow.
+        )
+
+    # Lookups.
+    _, hit_key = APIKey.objects.create_key(name="hit")
+    yield "get_from_key [hit]", lambda: APIKey.objects.get_from_key(hit_key), iterations
+
+    def get_from_key_or_none(key: str) -> typing.Optional[APIKey]:
+        try:
+            return APIKey.objects.get_from_key(key)
+        except APIKey.DoesNotExist:
+            return None
+
+    unknown_key = "abcdefgh." + "x" * 32
+    yield "get_from_key [miss]", lambda: get_from_key_or_none(unknown_key), iterations
+    yield (
+        "get_from_key [malformed]",
+        lambda: get_from_key_or_none("abcd.efgh"),
+        iterations,
+    )
+
+    _, expired_key = APIKey.objects.create_key(
+        name="expired", expiry_date=timezone.now() - timedelta(days=1)
+    )
+    yield (
+        "get_from_key [expired]",
+        lambda: get_from_key_or_none(expired_key),
+        iterations,
+    )
+
+    _, revoked_key = APIKey.objects.create_key(name="revoked", revoked=True)
+    yield (
+        "get_from_key [revoked]",
+        lambda: get_from_key_or_none(revoked_key),
+        iterations,
+    )
+
+    yield "is_valid [hit]", lambda: APIKey.objects.is_valid(hit_key), iterations
+
+    with override_settings(API_KEY_CACHE_SIZE=1000):
+        yield (
+            "get_from_key [hit, local cache]",
+            lambda: APIKey.objects.get_from_key(hit_key),
+            iterations,
+        )
+        yield (
+            "is_valid [hit, local cache]",
+            lambda: APIKey.objects.is_valid(hit_key),
+            iterations,
+        )
+
+    # Creation.
+    yield "create_key", lambda: APIKey.objects.create_key(name="create"), iterations
+
+    # Full request/response cycles.
+    client = APIClient()
+    _, hero_key = HeroAPIKey.objects.create_key(name="request", hero=hero)
+    yield (
+        "GET /api/protected/ [valid]",
+        lambda: client.get("/api/protected/", HTTP_AUTHORIZATION=f"Api-Key {hero_key}"),
+        iterations,
+    )
+    yield (
+        "GET /api/protected/ [invalid]",
+        lambda: client.get(
+            "/api/protected/", HTTP_AUTHORIZATION=f"Api-Key {unknown_key}"
+        ),
+        iterations,
+    )
+    yield (
+        "GET /api/protected/ [malformed]",
+        lambda: client.get("/api/protected/", HTTP_AUTHORIZATION="Api-Key abcd.efgh"),
+        iterations,
+    )
+    yield (
+        "GET /api/public/",
+        lambda: client.get("/api/public/"),
+        iterations,
+    )
+
+
+def report(results: typing.List[Result]) -> None:
+    headers = ("Benchmark", "Ops/s", "p50 (µs)", "p99 (µs)", "Queries/op")
+    rows = [
+        (
+            result.name,
+            f"{result.rps:,.0f}",
+            f"{result.percentile(50) * 1e6:,.1f}",
+            f"{result.percentile(99) * 1e6:,.1f}",
+            f"{result.queries / result.iterations:.2f}",
+        )
+        for result in results
+    ]
+    widths = [max(len(row[i]) for row in [headers, *rows]) for i in range(5)]
+
+    for row in [headers, *rows]:
+        print(
+            "  ".join(
+                cell.ljust(width) if i == 0 else cell.rjust(width)
+                for i, (cell, width) in enumerate(zip(row, widths))
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("-n", "--iterations", type=int, default=1000)
+    parser.add_argument("-k", "--filter", default="", help="Run matching benchmarks")
+    args = parser.parse_args()
+
+    settings.configure(**SETTINGS)
+    django.setup()
+
+    from django.db import connection
+
+    # Run against a throwaway database, like tests do.
+    old_name = connection.creation.create_test_db(verbosity=0)
+
+    try:
+        results = [
+            measure(name, func, iterations)
+            for name, func, iterations in get_benchmarks(args.iterations)
+            if args.filter in name
+        ]
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    report(results)